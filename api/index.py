@@ -2,18 +2,21 @@
 Vercel serverless function for Medical Chatbot API
 """
 
-import os
 import sys
+import threading
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
-import json
+from services.startup import startup_timings
+
+with startup_timings.phase("imports"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    
+    from services import api_routes
+    from services.api_routes import get_rag_service
 
 # Initialize FastAPI app
 app = FastAPI(title="Medical Chatbot API", version="1.0.0")
@@ -27,72 +30,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize RAG Service (lazy loading)
-rag_service = None
+# The shared query, health and metrics endpoints, under /api as the Vercel routes expect
+app.include_router(api_routes.router, prefix="/api")
 
-def get_rag_service():
-    global rag_service
-    if rag_service is None:
-        try:
-            print("Initializing RAG service...")
-            # For Vercel, we need to handle ChromaDB differently
-            from services.rag_service import RAGService
-            rag_service = RAGService()
-            print("RAG service initialized successfully")
-        except Exception as e:
-            print(f"Error initializing RAG service: {e}")
-            raise
-    return rag_service
-
-# Request/Response Models
-class QueryRequest(BaseModel):
-    query: str
-    top_k: int
+def initialize_rag_service():
+    """Load the model and index (and warm them up) before the first query arrives"""
+    try:
+        get_rag_service()
+    except Exception:
+        pass  # Reported by /api/ready; the next query retries
 
-class QueryResponse(BaseModel):
-    answer: str
-    contexts: List[str]
+@app.on_event("startup")
+def start_rag_service_initialization():
+    # In the background, so /health and /ready answer while the model loads
+    threading.Thread(target=initialize_rag_service, name="rag-init", daemon=True).start()
 
 # Vercel serverless handler
 def handler(request):
     return app
 
-@app.post("/api/query")
-async def query_endpoint(req: QueryRequest):
-    """
-    Main query endpoint for medical questions
-    """
-    try:
-        # Validate request
-        if not req.query or not req.query.strip():
-            raise HTTPException(status_code=400, detail="Query cannot be empty")
-        
-        top_k = req.top_k if req.top_k is not None else 5
-        top_k = max(1, min(top_k, 20))  # Clamp between 1 and 20
-        
-        # Get RAG service
-        service = get_rag_service()
-        
-        # Get answer and contexts from RAG service
-        result = service.get_answer(req.query, top_k=top_k)
-        
-        return QueryResponse(
-            answer=result["answer"],
-            contexts=result["contexts"]
-        )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-
-@app.get("/api/health")
-async def health_check():
-    return {"status": "healthy"}
-
-@app.get("/api/")
-async def root():
-    return {"status": "healthy", "service": "Medical Chatbot API"}
+@app.get("/api/startup")
+async def startup_report():
+    """Cold-start phase timings (imports, embedding model load, index open)"""
+    return {**startup_timings.report(), "rag_service_loaded": api_routes.rag_service is not None}
 
 # For Vercel serverless
 def main(request):
@@ -1,16 +1,26 @@
+import asyncio
+import hmac
 import os
+import subprocess
 import sys
+import threading
 from pathlib import Path
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import uvicorn
+from typing import Optional
 
 # Add current directory to path for imports
 sys.path.append(str(Path(__file__).parent))
 
-from services.rag_service import RAGService
+from services.startup import startup_timings
+
+with startup_timings.phase("imports"):
+    from fastapi import Depends, FastAPI, Header, HTTPException
+    from fastapi.middleware.cors import CORSMiddleware
+    import uvicorn
+    
+    from services import api_routes
+    from services.api_routes import get_rag_service
+    from services.prefork import memory_usage
+    from services.rag_service import RAGService
 
 # Initialize FastAPI app
 app = FastAPI(title="Medical Chatbot API", version="1.0.0")
@@ -24,69 +34,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize RAG Service (lazy loading)
-rag_service = None
-
-def get_rag_service():
-    global rag_service
-    if rag_service is None:
-        try:
-            print("Initializing RAG service...")
-            rag_service = RAGService()
-            print("RAG service initialized successfully")
-        except Exception as e:
-            print(f"Error initializing RAG service: {e}")
-            raise
-    return rag_service
-
-# Request/Response Models
-class QueryRequest(BaseModel):
-    query: str
-    top_k: int
-
-class QueryResponse(BaseModel):
-    answer: str
-    contexts: List[str]
-
-@app.post("/query", response_model=QueryResponse)
-async def query_endpoint(req: QueryRequest):
-    """
-    Main query endpoint for medical questions
-    """
+# /query, /query/stream, /query/batch, /, /health, /ready and /metrics
+app.include_router(api_routes.router)
+
+def initialize_rag_service():
+    """Load the model and index (and warm them up) before the first query arrives"""
     try:
-        # Validate request
-        if not req.query or not req.query.strip():
-            raise HTTPException(status_code=400, detail="Query cannot be empty")
-        
-        top_k = req.top_k if req.top_k is not None else 5
-        top_k = max(1, min(top_k, 20))  # Clamp between 1 and 20
-        
-        # Get RAG service
         service = get_rag_service()
-        
-        # Get answer and contexts from RAG service
-        result = service.get_answer(req.query, top_k=top_k)
-        
-        return QueryResponse(
-            answer=result["answer"],
-            contexts=result["contexts"]
-        )
+        if service.phase == "not_started":
+            # Pre-forked worker whose parent loaded only the model (see preload_rag_service)
+            service.initialize()
+        # Follow index versions activated by a rebuild in another worker
+        service.watch_index_versions()
+    except Exception:
+        pass  # Reported by /ready; the next query retries
+
+def preload_rag_service():
+    """
+    Load what the pre-forked workers share, once, in the parent process
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    The embedding model always; with VECTOR_BACKEND=numpy also the
+    memory-mapped indexes (and the warm-up). A Chroma client can't be used
+    across fork, so with Chroma each worker opens the index itself.
+    """
+    # Inference thread pools don't survive fork either: one thread per worker
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("EMBEDDING_THREADS", "1")
+    service = RAGService(auto_initialize=False)
+    if not service._has_complete_vectorstore():
+        # Build in a separate process so the parent forks without open index clients
+        print("Vector store missing or incomplete; building it before starting workers...")
+        subprocess.run([sys.executable, str(Path(__file__).parent / "init_vector_db.py")], check=True)
+    if service.vector_backend == "numpy":
+        service.initialize()
+    api_routes.rag_service = service
+
+# Token for the /admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.on_event("startup")
+def start_rag_service_initialization():
+    # In the background, so /health and /ready answer while the model loads
+    threading.Thread(target=initialize_rag_service, name="rag-init", daemon=True).start()
 
-@app.get("/")
-async def root():
-    return {"status": "healthy", "service": "Medical Chatbot API"}
+@app.get("/admin/index", dependencies=[Depends(require_admin)])
+async def index_status():
+    """Index versions on disk, the one being served, and rebuild progress"""
+    return get_rag_service().index_status()
+
+@app.post("/admin/index/rebuild", status_code=202, dependencies=[Depends(require_admin)])
+async def rebuild_index(full: bool = False):
+    """Build a new index version in the background and switch to it when it is ready"""
+    service = get_rag_service()
+    if not service.start_rebuild(full=full):
+        raise HTTPException(status_code=409, detail="An index rebuild is already running")
+    return service.index_status()
+
+@app.post("/admin/index/rollback", dependencies=[Depends(require_admin)])
+async def rollback_index():
+    """Switch back to the previous index version"""
+    service = get_rag_service()
+    try:
+        await asyncio.to_thread(service.rollback)
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return service.index_status()
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
+@app.get("/startup")
+async def startup_report():
+    """Cold-start phase timings (imports, embedding model load, index open) and this worker's memory"""
+    return {
+        **startup_timings.report(),
+        "rag_service_loaded": api_routes.rag_service is not None,
+        "pid": os.getpid(),
+        "memory_kb": memory_usage(os.getpid())
+    }
 
 if __name__ == "__main__":
     # Support deployment platforms (Render, Railway, etc.)
     port = int(os.environ.get("PORT", 8001))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_WORKERS", 1))
+    if workers > 1:
+        from services.prefork import serve_prefork
+        preload_rag_service()
+        serve_prefork(app, "0.0.0.0", port, workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
 
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Offline ingestion and query benchmark
+
+Generates a synthetic PDF corpus, builds an index from it in-process and
+runs RAGService.get_answer over generated questions, with no server
+involved. Reports ingestion pages/sec and chunks/sec, and query latency
+percentiles (overall and per pipeline stage). Results are written as JSON
+so later runs can be compared against a baseline:
+
+    python benchmark.py                                  # stub embedder, CI speed
+    python benchmark.py --embedder model --pdfs 20       # the real model
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json         # exit 1 on a regression
+
+The stub embedder hashes words into a fixed-size vector: deterministic and
+fast, so timings measure the pipeline rather than the model.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import textwrap
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+VOCABULARY = (
+    "diabetes insulin glucose hypertension myocardial infarction artery coronary thrombosis "
+    "asthma bronchitis pneumonia respiratory oxygen kidney renal dialysis liver hepatitis cirrhosis "
+    "fever infection antibiotic penicillin amoxicillin aspirin metformin anaemia vitamin deficiency "
+    "symptoms treatment diagnosis patient chronic acute dose therapy complication prognosis "
+    "inflammation fracture trauma emergency surgery anaesthesia nausea vomiting diarrhoea sepsis"
+).split()
+
+FILLER = "the of and in with is are may be for to a by as often usually commonly presents causes".split()
+
+# Lower is better for every compared metric except these
+HIGHER_IS_BETTER = {"pages_per_second", "chunks_per_second", "queries_per_second"}
+
+
+class StubEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words vectors (same dimension as MiniLM)"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            bucket = zlib.crc32(word.strip(".,;:?!()").encode())
+            vector[bucket % self.dim] += 1.0 if bucket & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def synthetic_sentence(rng: random.Random) -> str:
+    words = [rng.choice(VOCABULARY if rng.random() < 0.6 else FILLER) for _ in range(rng.randint(8, 24))]
+    return " ".join(words).capitalize() + "."
+
+
+def write_pdf(path: Path, pages: List[str]):
+    """Minimal PDF with one Helvetica text page per string (what PyPDF extracts back)"""
+    out = [b"%PDF-1.4\n"]
+    offsets = []
+
+    def add(body: bytes):
+        offsets.append(sum(len(part) for part in out))
+        out.append(f"{len(offsets)} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    add(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    add(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        operations = ["BT /F1 9 Tf"]
+        for line_number, line in enumerate(textwrap.wrap(text, 100)[:60]):
+            line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operations.append(f"1 0 0 1 40 {760 - 12 * line_number} Tm ({line}) Tj")
+        operations.append("ET")
+        stream = "\n".join(operations).encode("latin-1")
+        add(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        add(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    xref = sum(len(part) for part in out)
+    out.append(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    out += [f"{offset:010d} 00000 n \n".encode() for offset in offsets]
+    out.append(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    path.write_bytes(b"".join(out))
+
+
+def generate_corpus(directory: Path, pdfs: int, pages: int, seed: int):
+    """Write pdfs synthetic books of `pages` pages each"""
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    for book in range(pdfs):
+        book_pages = []
+        for page in range(pages):
+            heading = f"Chapter {page // 10 + 1}: {rng.choice(VOCABULARY).capitalize()}"
+            book_pages.append(heading + " " + " ".join(synthetic_sentence(rng) for _ in range(rng.randint(20, 35))))
+        write_pdf(directory / f"synthetic_{book:03d}.pdf", book_pages)
+
+
+def generate_questions(count: int, seed: int) -> List[str]:
+    """Distinct questions, so the query and answer caches don't hide the pipeline"""
+    rng = random.Random(seed + 1)
+    templates = ["What are the symptoms of {} and {}?", "How is {} treated in {} patients?",
+                 "What causes {} {}?", "Is {} a complication of {}?"]
+    questions = []
+    seen = set()
+    for i in range(count):
+        question = rng.choice(templates).format(rng.choice(VOCABULARY), rng.choice(VOCABULARY))
+        if question in seen:
+            question += f" (variant {i})"
+        seen.add(question)
+        questions.append(question)
+    return questions
+
+
+def percentiles(values_ms: List[float]) -> Dict[str, float]:
+    values = np.asarray(values_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def run(args) -> Dict:
+    if args.embedder == "stub":
+        from services import embeddings
+        embeddings.BACKENDS["stub"] = StubEmbeddings
+        os.environ["EMBEDDING_BACKEND"] = "stub"
+    # Every question is distinct; the warm-up query is not part of the measurement
+    os.environ.setdefault("WARM_UP", "0")
+
+    from services.ingestion import load_manifest
+    from services.rag_service import RAGService
+    from services.tracing import Trace
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="rag-benchmark-"))
+    corpus = work_dir / "corpus"
+    index = work_dir / "index"
+    shutil.rmtree(index, ignore_errors=True)
+    print(f"📄 Generating {args.pdfs} PDFs x {args.pages} pages in {corpus}...")
+    shutil.rmtree(corpus, ignore_errors=True)
+    generate_corpus(corpus, args.pdfs, args.pages, args.seed)
+
+    print(f"🏗️  Building the index ({args.embedder} embedder)...")
+    service = RAGService(data_path=str(corpus), persist_directory=str(index), auto_initialize=False,
+                         vector_backend=args.vector_backend)
+    start_time = time.perf_counter()
+    service.rebuild_vectorstore()
+    build_seconds = time.perf_counter() - start_time
+    if service.vectorstore is None:
+        raise RuntimeError(f"Index build failed: {service.initialization_error}")
+    chunks = service.vectorstore.count()
+    # The build may index only some of the PDFs (see _create_vectorstore_with_incremental_loading)
+    indexed = len(load_manifest(str(index))["files"])
+    if indexed < args.pdfs:
+        print(f"⚠️  Only {indexed} of {args.pdfs} PDFs were indexed")
+    pages = indexed * args.pages
+
+    questions = generate_questions(args.queries, args.seed)
+    print(f"🔎 Running {len(questions)} queries (top_k={args.top_k})...")
+    latencies = []
+    stages = {}
+    query_start = time.perf_counter()
+    for question in questions:
+        trace = Trace()
+        start_time = time.perf_counter()
+        with trace:
+            service.get_answer(question, top_k=args.top_k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        for stage, seconds in trace.stages.items():
+            stages.setdefault(stage, []).append(seconds * 1000)
+    query_seconds = time.perf_counter() - query_start
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "embedder": args.embedder if args.embedder == "stub" else os.getenv("EMBEDDING_BACKEND", "huggingface"),
+            "vector_backend": service.vector_backend,
+            "pdfs": args.pdfs,
+            "pages_per_pdf": args.pages,
+            "queries": len(questions),
+            "top_k": args.top_k,
+            "seed": args.seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "ingestion": {
+            "pages": pages,
+            "chunks": chunks,
+            "seconds": round(build_seconds, 3),
+            "pages_per_second": round(pages / build_seconds, 2),
+            "chunks_per_second": round(chunks / build_seconds, 2),
+        },
+        "query": {
+            **percentiles(latencies),
+            "queries_per_second": round(len(questions) / query_seconds, 2),
+            "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        },
+    }
+
+
+def compared_metrics(results: Dict) -> Dict[str, float]:
+    metrics = {f"ingestion.{name}": results["ingestion"][name]
+               for name in ("pages_per_second", "chunks_per_second")}
+    metrics.update({f"query.{name}": results["query"][name]
+                    for name in ("p50_ms", "p95_ms", "p99_ms", "queries_per_second")})
+    return metrics
+
+
+def compare(baseline: Dict, results: Dict, max_regression: float) -> List[str]:
+    """Print current vs baseline and return the metrics that regressed by more than max_regression"""
+    if baseline.get("config") != results["config"]:
+        print("⚠️  Baseline was run with a different configuration:")
+        print(f"   baseline {baseline.get('config')}")
+        print(f"   current  {results['config']}")
+    regressions = []
+    print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    before = compared_metrics(baseline)
+    for name, value in compared_metrics(results).items():
+        if name not in before or not before[name]:
+            continue
+        change = (value - before[name]) / before[name]
+        worse = -change if name.split(".")[1] in HIGHER_IS_BETTER else change
+        flag = "  ✗" if worse > max_regression else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28} {before[name]:>10.2f} {value:>10.2f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def print_results(results: Dict):
+    ingestion, query = results["ingestion"], results["query"]
+    print()
+    print(f"Ingestion: {ingestion['pages']} pages, {ingestion['chunks']} chunks in {ingestion['seconds']:.1f}s "
+          f"({ingestion['pages_per_second']:.1f} pages/s, {ingestion['chunks_per_second']:.1f} chunks/s)")
+    print(f"Queries:   p50 {query['p50_ms']:.2f} ms, p95 {query['p95_ms']:.2f} ms, p99 {query['p99_ms']:.2f} ms "
+          f"({query['queries_per_second']:.1f} queries/s)")
+    for stage, stats in query["stages"].items():
+        print(f"  {stage:<16} p50 {stats['p50_ms']:8.3f} ms   p95 {stats['p95_ms']:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--embedder", choices=["stub", "model"], default="stub",
+                        help="stub: hashed words; model: the EMBEDDING_BACKEND model")
+    parser.add_argument("--vector-backend", help="chroma or numpy (default: VECTOR_BACKEND or chroma)")
+    parser.add_argument("--pdfs", type=int, default=8, help="Synthetic PDFs to generate")
+    parser.add_argument("--pages", type=int, default=40, help="Pages per PDF")
+    parser.add_argument("--queries", type=int, default=200, help="Questions to run")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Keep the corpus and index here (default: a temporary directory)")
+    parser.add_argument("--output", metavar="PATH", help="Write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against an earlier --output")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Relative change counted as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_results(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(json.loads(Path(args.baseline).read_text()), results, args.max_regression)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} metrics regressed by more than {args.max_regression:.0%}")
+            return 1
+        print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Export the embedding model to ONNX for the onnx embedding backends
+
+Writes model.onnx, an int8 dynamically quantized model_int8.onnx and
+tokenizer.json to ./models/all-MiniLM-L6-v2-onnx (or EMBEDDING_ONNX_PATH).
+Needs PyTorch and transformers (already installed with
+sentence-transformers) plus onnxruntime; the API only needs onnxruntime
+and tokenizers afterwards.
+
+Then run with EMBEDDING_BACKEND=onnx (or onnx-int8) and check agreement
+with the reference model: python test_embeddings.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from services.embeddings import (
+    DEFAULT_ONNX_PATH,
+    MAX_SEQUENCE_LENGTH,
+    MODEL_NAME,
+    ONNX_INT8_MODEL_FILE,
+    ONNX_MODEL_FILE,
+)
+
+
+def main():
+    output = Path(sys.argv[1] if len(sys.argv) > 1 else os.getenv("EMBEDDING_ONNX_PATH", DEFAULT_ONNX_PATH))
+    output.mkdir(parents=True, exist_ok=True)
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"📦 Loading {MODEL_NAME}...")
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME).eval()
+
+    # The fast tokenizer writes tokenizer.json, which the backend loads with `tokenizers`
+    tokenizer.save_pretrained(output)
+
+    sample = tokenizer(["What are the symptoms of diabetes?"], return_tensors="pt",
+                       max_length=MAX_SEQUENCE_LENGTH, truncation=True)
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    print(f"🔄 Exporting to {output / ONNX_MODEL_FILE}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(output / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    print(f"🔄 Quantizing to {output / ONNX_INT8_MODEL_FILE}...")
+    quantize_dynamic(str(output / ONNX_MODEL_FILE), str(output / ONNX_INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    for name in (ONNX_MODEL_FILE, ONNX_INT8_MODEL_FILE):
+        print(f"✅ {name}: {(output / name).stat().st_size / 1e6:.1f} MB")
+    print()
+    print("Check agreement with the reference model before switching:")
+    print("  EMBEDDING_BACKEND=onnx python test_embeddings.py")
+
+
+if __name__ == "__main__":
+    main()
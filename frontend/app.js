@@ -56,6 +56,34 @@ function addMessage(content, isUser = false, contexts = []) {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+// Parse Server-Sent Events from a fetch() response, calling onEvent(event, data) for each
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 // Add loading indicator
 function addLoadingIndicator() {
     const loadingDiv = document.createElement('div');
@@ -118,7 +146,8 @@ async function sendQuery() {
         const topK = document.getElementById('topK').value;
         const apiUrl = getApiUrl();
         
-        const response = await fetch(`${apiUrl}/query`, {
+        // Streamed: the answer appears sentence by sentence once retrieval finishes
+        const response = await fetch(`${apiUrl}/query/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -129,17 +158,37 @@ async function sendQuery() {
             })
         });
         
-        // Remove loading indicator
-        removeLoadingIndicator();
-        
         if (!response.ok) {
             throw new Error(`API error: ${response.status}`);
         }
         
-        const data = await response.json();
+        let messageText = null;
+        let streamError = null;
+        await readEventStream(response, (event, data) => {
+            if (event === 'retrieval') {
+                // Replace the spinner with the message the sentences are written into
+                removeLoadingIndicator();
+                addMessage('', false);
+                messageText = chatMessages.lastElementChild.querySelector('.message-text');
+                updateStatus('loading', 'Writing answer...');
+            } else if (event === 'answer' && messageText) {
+                messageText.textContent += data.text;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (event === 'done') {
+                removeLoadingIndicator();
+                if (messageText) {
+                    // Swap the streamed text for the full message, contexts included, as /query renders it
+                    messageText.closest('.message').remove();
+                }
+                addMessage(data.answer, false, data.contexts);
+            } else if (event === 'error') {
+                streamError = data.detail;
+            }
+        });
         
-        // Add assistant message with contexts
-        addMessage(data.answer, false, data.contexts);
+        if (streamError) {
+            throw new Error(streamError);
+        }
         
         updateStatus('ready', 'Ready');
     } catch (error) {
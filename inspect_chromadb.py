@@ -5,16 +5,19 @@ Inspect ChromaDB contents to verify data is properly stored and retrievable
 
 import sys
 from pathlib import Path
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 
+from services.embeddings import create_query_embeddings
+from services.index_versions import IndexVersions
+
 def inspect_chromadb():
     """Check what's in ChromaDB"""
     
-    persist_directory = "./chroma_db"
+    # The version being served, not an older index left in the root
+    persist_directory = str(IndexVersions("./chroma_db").current_path())
     
     if not Path(persist_directory).exists():
-        print("❌ ChromaDB not found at: ./chroma_db")
+        print(f"❌ ChromaDB not found at: {persist_directory}")
         print("   Run the initialization script first: python init_vector_db.py")
         return
     
@@ -26,9 +29,7 @@ def inspect_chromadb():
     try:
         # Load embeddings
         print("📦 Loading embeddings model...")
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        embeddings = create_query_embeddings()
         
         # Load ChromaDB
         print("📂 Loading ChromaDB...")
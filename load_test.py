@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Load generator for the /query API
+
+Drives a running server with concurrent requests and reports throughput,
+latency percentiles and error/503 rates, to find how many queries per
+second one node sustains.
+
+Closed loop (--concurrency): N clients each send their next request as
+soon as the previous one returns. Open loop (--rate): requests arrive at a
+fixed average rate (Poisson arrivals) whether or not earlier ones have
+finished, which is how real traffic behaves. Several levels can be swept
+to find the knee, the last level before latency climbs without a matching
+gain in throughput:
+
+    python load_test.py --url http://localhost:8001 --concurrency 1 2 4 8 16 32
+    python load_test.py --rate 5 10 20 40 --duration 30 --questions questions.txt
+    python load_test.py --url https://your-app.vercel.app --endpoint /api/query --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+DEFAULT_QUESTIONS = [
+    "What are the symptoms of diabetes?",
+    "How is hypertension treated?",
+    "What causes myocardial infarction?",
+    "What are the side effects of metformin?",
+    "What is COPD?",
+    "How does insulin regulate blood glucose?",
+    "What are the signs of vitamin B12 deficiency?",
+    "What is the first-line antibiotic for community-acquired pneumonia?",
+    "How is asthma diagnosed?",
+    "What are the complications of cirrhosis?",
+]
+
+# A level is past the knee when p95 grows by more than this factor over the lightest level...
+KNEE_LATENCY_FACTOR = 2.0
+# ...while throughput grows by less than this fraction over the previous level
+KNEE_MIN_THROUGHPUT_GAIN = 0.10
+
+
+def load_questions(path: str) -> List[str]:
+    """Questions from a text file (one per line), a JSON list, or JSON lines with a "query" field"""
+    text = Path(path).read_text()
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+    else:
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            items.append(json.loads(line) if line.startswith("{") else line)
+    questions = [item["query"] if isinstance(item, dict) else str(item) for item in items]
+    if not questions:
+        raise ValueError(f"No questions in {path}")
+    return questions
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []  # seconds, successful requests only
+        self.statuses = {}
+        self.errors = 0      # connection errors and timeouts
+        self.dropped = 0     # open-loop arrivals not sent because max_in_flight was reached
+
+    def record(self, status: int, seconds: float):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 200:
+            self.latencies.append(seconds)
+
+    def summary(self, label: str, elapsed: float) -> Dict:
+        total = sum(self.statuses.values()) + self.errors + self.dropped
+        ok = self.statuses.get(200, 0)
+        latencies_ms = np.asarray(self.latencies) * 1000
+        result = {
+            "level": label,
+            "requests": total,
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round((total - ok) / total, 4) if total else 0.0,
+            "rate_503": round(self.statuses.get(503, 0) / total, 4) if total else 0.0,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "connection_errors": self.errors,
+            "dropped": self.dropped,
+        }
+        for p in (50, 90, 95, 99):
+            result[f"p{p}_ms"] = round(float(np.percentile(latencies_ms, p)), 2) if ok else None
+        return result
+
+
+async def send(client: httpx.AsyncClient, url: str, question: str, top_k: int, recorder: Recorder):
+    start_time = time.perf_counter()
+    try:
+        response = await client.post(url, json={"query": question, "top_k": top_k})
+    except httpx.HTTPError:
+        recorder.errors += 1
+        return
+    recorder.record(response.status_code, time.perf_counter() - start_time)
+
+
+async def closed_loop(client, url, questions, top_k, concurrency: int, duration: float) -> Recorder:
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    rng = random.Random(concurrency)
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            await send(client, url, rng.choice(questions), top_k, recorder)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return recorder
+
+
+async def open_loop(client, url, questions, top_k, rate: float, duration: float, max_in_flight: int) -> Recorder:
+    recorder = Recorder()
+    rng = random.Random(int(rate * 1000))
+    in_flight = set()
+    start_time = time.perf_counter()
+    next_arrival = start_time
+    while next_arrival < start_time + duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if len(in_flight) >= max_in_flight:
+            # The generator itself is saturated; count it rather than silently slowing down
+            recorder.dropped += 1
+        else:
+            task = asyncio.create_task(send(client, url, rng.choice(questions), top_k, recorder))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_arrival += rng.expovariate(rate)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return recorder
+
+
+def find_knee(results: List[Dict]) -> Dict:
+    """The last level before p95 latency blows up without a matching throughput gain"""
+    measured = [result for result in results if result["p95_ms"] is not None]
+    if len(measured) < 2:
+        return measured[-1] if measured else None
+    base_p95 = measured[0]["p95_ms"]
+    knee = measured[0]
+    for previous, current in zip(measured, measured[1:]):
+        gain = (current["throughput_rps"] - previous["throughput_rps"]) / max(previous["throughput_rps"], 1e-9)
+        if current["p95_ms"] > KNEE_LATENCY_FACTOR * base_p95 and gain < KNEE_MIN_THROUGHPUT_GAIN:
+            break
+        if current["error_rate"] > 0.01:
+            break
+        knee = current
+    return knee
+
+
+def print_table(results: List[Dict], mode: str):
+    print()
+    print(f"{mode:>12} {'requests':>9} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'errors':>7} {'503s':>7}")
+    for r in results:
+        latencies = " ".join(f"{r[key]:8.1f}" if r[key] is not None else f"{'-':>8}"
+                             for key in ("p50_ms", "p90_ms", "p95_ms", "p99_ms"))
+        print(f"{r['level']:>12} {r['requests']:>9} {r['throughput_rps']:>8.1f} {latencies} "
+              f"{r['error_rate']:>7.1%} {r['rate_503']:>7.1%}")
+
+
+async def run(args) -> List[Dict]:
+    questions = load_questions(args.questions) if args.questions else DEFAULT_QUESTIONS
+    url = args.url.rstrip("/") + args.endpoint
+    levels = args.rate or args.concurrency
+    mode = "rate" if args.rate else "concurrency"
+    connections = max(args.max_in_flight if args.rate else max(args.concurrency), 1)
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    results = []
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if args.warmup:
+            print(f"Warming up for {args.warmup:.0f}s...")
+            await closed_loop(client, url, questions, args.top_k, 1, args.warmup)
+        for level in levels:
+            print(f"▶️  {mode} {level} for {args.duration:.0f}s against {url}")
+            start_time = time.perf_counter()
+            if args.rate:
+                recorder = await open_loop(client, url, questions, args.top_k, level, args.duration, args.max_in_flight)
+            else:
+                recorder = await closed_loop(client, url, questions, args.top_k, int(level), args.duration)
+            results.append(recorder.summary(str(level), time.perf_counter() - start_time))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:8001", help="Server base URL")
+    parser.add_argument("--endpoint", default="/query", help="Query path (/api/query on Vercel)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                       help="Closed loop: concurrent clients per level")
+    group.add_argument("--rate", type=float, nargs="+", help="Open loop: requests/second per level")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per level")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of single-client warm-up (0 skips it)")
+    parser.add_argument("--questions", help="Question file (lines, JSON list, or JSON lines with \"query\")")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="Open loop: outstanding requests before arrivals count as errors")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    mode = "rate" if args.rate else "concurrency"
+    print_table(results, mode)
+
+    knee = find_knee(results)
+    if knee is not None and len(results) > 1:
+        print(f"\n📈 Knee: {mode} {knee['level']} "
+              f"({knee['throughput_rps']:.1f} req/s at p95 {knee['p95_ms']:.0f} ms)")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"mode": mode, "url": args.url + args.endpoint,
+                                               "levels": results, "knee": knee}, indent=2) + "\n")
+        print(f"💾 Results written to {args.json}")
+    return 0 if any(result["throughput_rps"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
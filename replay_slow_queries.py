@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Replay the slow-query log against an index, in-process
+
+Runs each logged query through RAGService.get_answer with tracing on and
+prints the logged and replayed stage timings side by side, and whether the
+same chunks came back. Point it at the index the log was written against
+(the log records its persist_directory and index_version):
+
+    python replay_slow_queries.py
+    python replay_slow_queries.py --log slow_queries.jsonl --slowest 10 --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from services.tracing import Trace, load_slow_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--log", default=os.getenv("SLOW_QUERY_LOG", "slow_queries.jsonl"), help="Slow-query log to replay")
+    parser.add_argument("--persist-directory", help="Index to query (default: the one recorded in the log)")
+    parser.add_argument("--slowest", type=int, default=0, metavar="N", help="Only replay the N slowest entries")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per query (later runs may hit the caches)")
+    args = parser.parse_args()
+
+    try:
+        entries = load_slow_queries(args.log)
+    except OSError as e:
+        print(f"❌ Could not read {args.log}: {e}")
+        return 1
+    if not entries:
+        print(f"ℹ️  {args.log} is empty")
+        return 0
+    if args.slowest:
+        entries = sorted(entries, key=lambda entry: -entry["total_ms"])[:args.slowest]
+
+    persist_directory = args.persist_directory or entries[-1].get("persist_directory", "./chroma_db")
+    from services.rag_service import RAGService
+    service = RAGService(persist_directory=persist_directory, vector_backend=entries[-1].get("vector_backend"))
+    if service.vectorstore is None:
+        print(f"❌ No complete index at {persist_directory}")
+        return 1
+    logged_versions = {entry.get("index_version") for entry in entries}
+    if logged_versions != {service.index_version}:
+        print(f"⚠️  Log was written against index version(s) {sorted(map(str, logged_versions))}, "
+              f"replaying against {service.index_version}")
+
+    print(f"Replaying {len(entries)} queries against {persist_directory}")
+    for entry in entries:
+        print()
+        print(f"🔎 {entry['query'][:80]!r} (top_k={entry['top_k']})")
+        print(f"   logged   {entry['total_ms']:9.2f} ms  {format_stages(entry['stages_ms'])}")
+        logged_chunks = [chunk["chunk_id"] for chunk in entry.get("chunks", [])]
+        traces = []
+        for _ in range(max(1, args.repeat)):
+            trace = Trace()
+            traces.append(trace)
+            start_time = time.perf_counter()
+            with trace:
+                service.get_answer(entry["query"], top_k=entry["top_k"])
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            stages_ms = {stage: seconds * 1000 for stage, seconds in trace.stages.items()}
+            print(f"   replayed {elapsed_ms:9.2f} ms  {format_stages(stages_ms)}"
+                  + ("  (answer cache hit)" if trace.cached else ""))
+        # Later runs may be answer cache hits, so compare the first one
+        if traces[0].cached or entry.get("cached"):
+            continue
+        replayed_chunks = [chunk_id for chunk_id, _ in traces[0].chunks]
+        if replayed_chunks == logged_chunks:
+            print("   ✓ same chunks")
+        else:
+            print(f"   ✗ different chunks: logged {logged_chunks}, replayed {replayed_chunks}")
+    return 0
+
+
+def format_stages(stages_ms):
+    return "  ".join(f"{stage}={value:.2f}" for stage, value in stages_ms.items())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
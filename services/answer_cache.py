@@ -0,0 +1,147 @@
+"""
+Semantic answer cache
+
+Paraphrased questions usually retrieve the same best chunk and extract the
+same answer. This cache matches on query-embedding cosine similarity, so a
+hit skips both the vector search and the sentence extraction.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by query vector
+
+    A lookup hits when a cached query for the same variant (e.g. top_k) has
+    cosine similarity >= threshold with the new one. Entries expire after
+    ttl_seconds, the least recently used entry is evicted when the cache is
+    full, and everything is dropped when the index version changes.
+    """
+
+    def __init__(self, threshold: float = None, ttl_seconds: float = None, max_entries: int = None):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a hit (default: ANSWER_CACHE_THRESHOLD or 0.95)
+            ttl_seconds: Entry lifetime (default: ANSWER_CACHE_TTL or 3600)
+            max_entries: Capacity, 0 disables the cache (default: ANSWER_CACHE_SIZE or 1024)
+        """
+        if threshold is None:
+            threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        if max_entries is None:
+            max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max(0, max_entries)
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._expires = np.zeros(self.max_entries)
+        self._last_used = np.zeros(self.max_entries)
+        # Variants are interned to int codes, so get() filters them with one vector compare
+        self._codes = np.full(self.max_entries, -1, dtype=np.int64)
+        self._variant_codes: Dict[Hashable, int] = {}
+        self._answers = [None] * self.max_entries
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _normalize(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, index_version: Hashable):
+        # Called with the lock held
+        if index_version != self._version:
+            self._drop_entries()
+            self._version = index_version
+
+    def _drop_entries(self):
+        # Called with the lock held
+        self._expires[:] = 0
+        self._answers = [None] * self.max_entries
+        self._codes[:] = -1
+        self._variant_codes.clear()
+
+    def get(self, vector, index_version: Hashable, variant: Hashable = None) -> Optional[Dict]:
+        """Cached answer for a similar query, or None"""
+        hit = self.get_with_retrieval(vector, index_version, variant)
+        return hit[0] if hit is not None else None
+
+    def get_with_retrieval(self, vector, index_version: Hashable,
+                           variant: Hashable = None) -> Optional[Tuple[Dict, Dict]]:
+        """Cached answer for a similar query and the retrieval summary stored with it, or None"""
+        if not self.enabled:
+            return None
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(index_version)
+            code = self._variant_codes.get(variant)
+            if self._vectors is None or code is None:
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            candidates = (self._expires > now) & (self._codes == code)
+            similarities[~candidates] = -1.0
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[slot] = now
+            self.hits += 1
+            answer = self._answers[slot]
+        return {"answer": answer["answer"], "contexts": list(answer["contexts"])}, dict(answer["retrieval"])
+
+    def put(self, vector, index_version: Hashable, answer: Dict, variant: Hashable = None,
+            retrieval: Dict = None):
+        """
+        Cache an answer, evicting an expired or the least recently used entry if full
+
+        retrieval (e.g. the best chunk's source) is handed back by get_with_retrieval.
+        """
+        if not self.enabled:
+            return
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(index_version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+            # Expired slots have last-used time pushed back so they go first
+            slot = int(np.argmin(np.where(self._expires > now, self._last_used, -np.inf)))
+            self._vectors[slot] = query
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._codes[slot] = self._variant_codes.setdefault(variant, len(self._variant_codes))
+            self._answers[slot] = {"answer": answer["answer"], "contexts": list(answer["contexts"]),
+                                   "retrieval": dict(retrieval or {})}
+
+    def clear(self):
+        """Drop every cached answer (hit/miss counters are kept)"""
+        with self._lock:
+            self._drop_entries()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": int((self._expires > time.monotonic()).sum()),
+                "max_entries": self.max_entries,
+                "index_version": self._version
+            }
@@ -0,0 +1,274 @@
+"""
+Query, health and metrics endpoints shared by app.py and api/index.py
+
+Both apps include `router` (the Vercel one under /api) and add their own
+startup hooks and deployment-specific endpoints. The RAG service singleton
+lives here too, so every route and both apps see the same instance.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from services import metrics
+from services.executor import QueryExecutor, QueryQueueFull
+from services.startup import startup_timings
+from services.tracing import SlowQueryLog, Trace
+
+router = APIRouter()
+
+# Initialize RAG Service (started at app startup, built exactly once)
+rag_service = None
+rag_service_lock = threading.Lock()
+rag_service_error = None
+
+def get_rag_service():
+    global rag_service, rag_service_error
+    if rag_service is None:
+        # Concurrent first requests wait for one instance instead of each loading a model
+        with rag_service_lock:
+            if rag_service is None:
+                try:
+                    print("Initializing RAG service...")
+                    # Imported on first use, so /health answers before the heavy imports
+                    with startup_timings.phase("rag_service_import"):
+                        from services.rag_service import RAGService
+                    service = RAGService(auto_initialize=False)
+                    # Published before the index is opened or built, so /ready reports those phases
+                    rag_service = service
+                    rag_service_error = None
+                    service.initialize()
+                    print("RAG service initialized successfully")
+                except Exception as e:
+                    rag_service_error = str(e)
+                    print(f"Error initializing RAG service: {e}")
+                    raise
+    return rag_service
+
+def readiness_status():
+    """Initialization phase and progress; ready only once queries can be answered"""
+    if rag_service is not None:
+        return rag_service.status()
+    return {
+        "ready": False,
+        "phase": "failed" if rag_service_error else "loading_model",
+        "initialization_started": rag_service_lock.locked() or rag_service_error is not None,
+        "initialization_complete": False,
+        "progress": {},
+        "index_version": None,
+        "error": rag_service_error
+    }
+
+# Blocking query work runs here so the event loop stays responsive
+# (QUERY_WORKERS / QUERY_QUEUE_LIMIT control concurrency and backlog)
+query_executor = QueryExecutor()
+
+def answer_query(query: str, top_k: int, return_contexts: bool = False, trace: Trace = None):
+    """Blocking part of a query: service lookup, retrieval and answer extraction"""
+    if trace is None:
+        return get_rag_service().get_answer(query, top_k=top_k, return_contexts=return_contexts)
+    # Stage timings recorded on this worker thread go to the trace
+    with trace:
+        return get_rag_service().get_answer(query, top_k=top_k, return_contexts=return_contexts)
+
+def stream_query(query: str, top_k: int, return_contexts: bool, emit):
+    """Blocking part of a streamed query: emit(event, data) per step, ending with done or error"""
+    try:
+        for event, data in get_rag_service().stream_answer(query, top_k=top_k, return_contexts=return_contexts):
+            emit(event, data)
+    except Exception as e:
+        emit("error", {"detail": f"Internal server error: {str(e)}"})
+
+def answer_queries(queries: List[str], top_ks: List[int], return_contexts: List[bool]):
+    """Blocking part of a batch query"""
+    return get_rag_service().get_answers(queries, top_ks=top_ks, return_contexts=return_contexts)
+
+def clamp_top_k(top_k: Optional[int]) -> int:
+    top_k = top_k if top_k is not None else 5
+    return max(1, min(top_k, 20))  # Clamp between 1 and 20
+
+def server_busy() -> HTTPException:
+    """503 for a request the executor queue had no room for"""
+    metrics.queries_rejected.inc()
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy. Please retry shortly.",
+        headers={"Retry-After": "1"}
+    )
+
+# Server-Timing header on every /query response (otherwise only with ?trace=true)
+QUERY_TRACE = os.environ.get("QUERY_TRACE", "0") == "1"
+
+# Queries slower than SLOW_QUERY_MS go to SLOW_QUERY_LOG (off unless it is set)
+slow_query_log = SlowQueryLog()
+
+# Largest list accepted by the batch endpoint
+MAX_BATCH_QUERIES = int(os.environ.get("QUERY_BATCH_LIMIT", 256))
+
+@router.on_event("shutdown")
+def shutdown_query_executor():
+    query_executor.shutdown()
+
+# Request/Response Models
+class QueryRequest(BaseModel):
+    query: str
+    top_k: int
+    return_contexts: bool = False
+
+class QueryResponse(BaseModel):
+    answer: str
+    contexts: List[str]
+
+class BatchQueryResult(BaseModel):
+    answer: Optional[str] = None
+    contexts: List[str] = []
+    error: Optional[str] = None
+
+@router.post("/query", response_model=QueryResponse)
+async def query_endpoint(req: QueryRequest, trace: bool = False):
+    """
+    Main query endpoint for medical questions
+    
+    With trace=true (or QUERY_TRACE=1) the response carries a Server-Timing
+    header with the embed, cache, search, extract and serialize durations.
+    """
+    start_time = time.perf_counter()
+    try:
+        # Validate request
+        if not req.query or not req.query.strip():
+            raise HTTPException(status_code=400, detail="Query cannot be empty")
+        
+        top_k = clamp_top_k(req.top_k)
+        
+        # Stage timings are collected when they're returned or may end up in the slow-query log
+        server_timing = trace or QUERY_TRACE
+        query_trace = Trace() if server_timing or slow_query_log.enabled else None
+        
+        # Get answer and contexts from RAG service without blocking the event loop
+        try:
+            result = await query_executor.run(answer_query, req.query, top_k, req.return_contexts, query_trace)
+        except QueryQueueFull:
+            raise server_busy()
+        
+        response = QueryResponse(
+            answer=result["answer"],
+            contexts=result["contexts"]
+        )
+        if query_trace is None:
+            return response
+        
+        serialize_start = time.perf_counter()
+        json_response = JSONResponse(content=response.model_dump())
+        query_trace.add("serialize", time.perf_counter() - serialize_start)
+        elapsed = time.perf_counter() - start_time
+        if server_timing:
+            json_response.headers["Server-Timing"] = query_trace.server_timing(total=elapsed)
+        slow_query_log.record(req.query, top_k, query_trace, elapsed, rag_service)
+        return json_response
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.post("/query/stream")
+async def stream_query_endpoint(req: QueryRequest):
+    """
+    Streamed variant of /query, as Server-Sent Events
+    
+    "retrieval" arrives as soon as the search returns (with the best
+    chunk's source), then one "answer" event per answer sentence, then
+    "done" with the full response ("error" instead if the query fails).
+    """
+    if not req.query or not req.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+    
+    try:
+        query_executor.submit(stream_query, req.query, clamp_top_k(req.top_k), req.return_contexts, emit)
+    except QueryQueueFull:
+        raise server_busy()
+    
+    async def event_stream():
+        while True:
+            event, data = await events.get()
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event in ("done", "error"):
+                break
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # No caching or proxy buffering, or the events arrive all at once
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/query/batch", response_model=List[BatchQueryResult])
+async def batch_query_endpoint(reqs: List[QueryRequest]):
+    """
+    Answer a list of medical questions in one round trip
+    
+    Results come back in request order. An invalid or failed item gets an
+    "error" instead of failing the whole batch.
+    """
+    if not reqs:
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    if len(reqs) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"Batch cannot exceed {MAX_BATCH_QUERIES} queries")
+    
+    results = [BatchQueryResult(error="Query cannot be empty") for _ in reqs]
+    valid = [i for i, req in enumerate(reqs) if req.query and req.query.strip()]
+    if not valid:
+        return results
+    
+    try:
+        answers = await query_executor.run(
+            answer_queries,
+            [reqs[i].query for i in valid],
+            [clamp_top_k(reqs[i].top_k) for i in valid],
+            [reqs[i].return_contexts for i in valid]
+        )
+    except QueryQueueFull:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    for i, answer in zip(valid, answers):
+        results[i] = BatchQueryResult(**answer)
+    return results
+
+@router.get("/")
+async def root():
+    return {"status": "healthy", "service": "Medical Chatbot API"}
+
+@router.get("/health")
+async def health_check():
+    return {"status": "healthy"}
+
+@router.get("/ready")
+async def readiness_check():
+    """503 with Retry-After until the model and index are loaded and warmed up"""
+    status = readiness_status()
+    if status["ready"]:
+        return status
+    # Building an index takes minutes, loading one takes seconds
+    retry_after = "30" if status["phase"] == "building_index" else "5"
+    return JSONResponse(status_code=503, content=status, headers={"Retry-After": retry_after})
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency, caches, initialization, index size, executor queue"""
+    families = metrics.service_metrics(rag_service, query_executor)
+    return PlainTextResponse(metrics.render(families), media_type="text/plain; version=0.0.4")
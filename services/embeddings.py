@@ -0,0 +1,375 @@
+"""
+Embedding model backends and the query-side wrappers around them
+
+Each class is a LangChain Embeddings, so it can be passed anywhere the
+plain HuggingFaceEmbeddings was used (including Chroma's embedding_function).
+create_query_embeddings() builds the stack every caller should use:
+query cache -> micro-batcher -> model.
+
+The model backend is chosen with EMBEDDING_BACKEND:
+
+- "huggingface" (default): sentence-transformers on PyTorch, float32.
+- "torch-int8": the same model with its Linear layers dynamically
+  quantized to int8.
+- "onnx" / "onnx-int8": an exported ONNX model (see export_onnx_model.py)
+  run by onnxruntime, with no PyTorch in the process.
+
+All backends produce vectors that agree with the reference model
+(check with test_embeddings.py), so an index built with one can be
+queried with another.
+"""
+
+import os
+import queue
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+DEFAULT_BACKEND = "huggingface"
+
+# Where export_onnx_model.py writes the exported model and tokenizer
+DEFAULT_ONNX_PATH = "./models/all-MiniLM-L6-v2-onnx"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+
+# Token limit of all-MiniLM-L6-v2 in sentence-transformers
+MAX_SEQUENCE_LENGTH = 256
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def get_embedding_backend(backend: str = None) -> str:
+    """Backend name (default: EMBEDDING_BACKEND or "huggingface")"""
+    if backend is None:
+        backend = os.getenv("EMBEDDING_BACKEND", DEFAULT_BACKEND)
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r} (expected one of: {', '.join(BACKENDS)})")
+    return backend
+
+
+def create_model_embeddings(backend: str = None) -> Embeddings:
+    """The MiniLM model on the configured backend, without any wrappers"""
+    return BACKENDS[get_embedding_backend(backend)]()
+
+
+def create_query_embeddings() -> Embeddings:
+    """The MiniLM model behind the query cache and micro-batcher, as used by every caller"""
+    return CachedQueryEmbeddings(MicroBatchingEmbeddings(create_model_embeddings()))
+
+
+def create_huggingface_embeddings(model_name: str = MODEL_NAME) -> Embeddings:
+    """The reference sentence-transformers model (imported here: the import alone takes about a second)"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+class QuantizedTorchEmbeddings(Embeddings):
+    """sentence-transformers with Linear layers dynamically quantized to int8"""
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name, device="cpu")
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    The exported MiniLM model on onnxruntime
+
+    Reproduces the sentence-transformers pipeline: tokenize, run the
+    transformer, mean-pool token vectors over the attention mask and
+    L2-normalize.
+    """
+
+    def __init__(self, model_path: str = None, model_file: str = ONNX_MODEL_FILE, threads: int = None):
+        """
+        Args:
+            model_path: Directory with the model and tokenizer.json (default: EMBEDDING_ONNX_PATH or ./models/all-MiniLM-L6-v2-onnx)
+            model_file: Model file in that directory (model.onnx, or model_int8.onnx for the quantized one)
+            threads: onnxruntime intra-op threads (default: EMBEDDING_THREADS or onnxruntime's choice)
+        """
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The onnx embedding backends need: pip install onnxruntime tokenizers") from e
+        
+        if model_path is None:
+            model_path = os.getenv("EMBEDDING_ONNX_PATH", DEFAULT_ONNX_PATH)
+        if threads is None:
+            threads = int(os.getenv("EMBEDDING_THREADS", "0"))
+        model_path = Path(model_path)
+        if not (model_path / model_file).exists():
+            raise FileNotFoundError(f"{model_path / model_file} not found. Export it with: python export_onnx_model.py")
+        
+        self.tokenizer = Tokenizer.from_file(str(model_path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQUENCE_LENGTH)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path / model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(list(texts))
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        token_vectors = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        
+        # Mean over real tokens, then unit length (the model's Pooling + Normalize modules)
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (token_vectors * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# Live batchers, so a pre-forked server worker can restart their threads (see restart_batchers)
+_batchers = weakref.WeakSet()
+
+
+def restart_batchers():
+    """
+    Start a fresh batcher thread for every live MicroBatchingEmbeddings
+
+    Threads don't survive fork. The pre-fork server calls this in each
+    worker it forks; no other forked process (e.g. a parse pool child)
+    gets batcher threads.
+    """
+    for batcher in list(_batchers):
+        batcher._start_worker()
+
+
+def normalize_query(text: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different questions share a key"""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """
+    Encodes concurrent queries together
+
+    embed_query() calls that arrive within window_ms of each other (up to
+    max_batch_size of them) are encoded in a single embed_documents() call
+    on the wrapped model, and each caller gets its own vector back. Document
+    embedding during ingestion is passed straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = None, window_ms: float = None):
+        """
+        Args:
+            embeddings: Model to wrap
+            max_batch_size: Most queries per encode (default: EMBED_MAX_BATCH or 32)
+            window_ms: How long the first query of a batch waits for others (default: EMBED_BATCH_WINDOW_MS or 2)
+        """
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("EMBED_MAX_BATCH", "32"))
+        if window_ms is None:
+            window_ms = float(os.getenv("EMBED_BATCH_WINDOW_MS", "2"))
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000
+        self._batches = 0
+        self._queries = 0
+        self._batch_sizes = {}
+        self._start_worker()
+        _batchers.add(self)
+    
+    def _start_worker(self):
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        # The thread only holds a weak reference, and stops once the batcher is garbage collected
+        weakref.finalize(self, self._queue.put, None)
+        self._worker = threading.Thread(target=self._run, args=(weakref.ref(self), self._queue),
+                                        name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _collect_batch(self, first) -> List:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # With a zero window, still take whatever is already waiting
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _run(batcher_ref, requests: queue.Queue):
+        while True:
+            first = requests.get()
+            batcher = batcher_ref()
+            if first is None or batcher is None:
+                return
+            batcher._encode(batcher._collect_batch(first))
+            del batcher
+
+    def _encode(self, batch: List):
+        try:
+            vectors = self.embeddings.embed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+        self._record(len(batch))
+
+    def _record(self, size: int):
+        with self._stats_lock:
+            self._batches += 1
+            self._queries += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+
+    def stats(self) -> Dict:
+        """Batch fill metrics: batch count, queries, mean size, fill ratio and size histogram"""
+        with self._stats_lock:
+            mean_size = self._queries / self._batches if self._batches else 0.0
+            return {
+                "batches": self._batches,
+                "queries": self._queries,
+                "mean_batch_size": mean_size,
+                "fill_ratio": mean_size / self.max_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "window_ms": self.window * 1000,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items()))
+            }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Bounded LRU cache of query embeddings
+
+    Queries are keyed (and embedded) by their normalized text, so "What is
+    diabetes?" and "what is  diabetes" pay for one forward pass. Vectors are
+    kept as float32 arrays and the least recently used ones are evicted once
+    the cache grows past max_mb. Document embedding is passed straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_mb: float = None):
+        """
+        Args:
+            embeddings: Model (or batcher) to wrap
+            max_mb: Memory cap for cached vectors and keys (default: EMBED_CACHE_MB or 16)
+        """
+        if max_mb is None:
+            max_mb = float(os.getenv("EMBED_CACHE_MB", "16"))
+        self.embeddings = embeddings
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            self.misses += 1
+
+        vector = np.asarray(self.embeddings.embed_query(key), dtype=np.float32)
+        self._store(key, vector)
+        return vector.tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries at once: cache hits are reused, misses share one encode call"""
+        keys = [normalize_query(text) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    vectors[key] = vector
+            self.hits += sum(1 for key in keys if key in vectors)
+            self.misses += sum(1 for key in keys if key not in vectors)
+
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing:
+            # Already a batch, so skip the micro-batcher's collection window
+            for key, vector in zip(missing, self.embeddings.embed_documents(missing)):
+                vectors[key] = np.asarray(vector, dtype=np.float32)
+                self._store(key, vectors[key])
+        return [vectors[key].tolist() for key in keys]
+
+    def _store(self, key: str, vector: np.ndarray):
+        size = vector.nbytes + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, old_vector = self._cache.popitem(last=False)
+                self._bytes -= old_vector.nbytes + len(old_key)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+BACKENDS = {
+    "huggingface": create_huggingface_embeddings,
+    "torch-int8": QuantizedTorchEmbeddings,
+    "onnx": OnnxEmbeddings,
+    "onnx-int8": lambda: OnnxEmbeddings(model_file=ONNX_INT8_MODEL_FILE),
+}
@@ -0,0 +1,77 @@
+"""
+Bounded executor for running blocking RAG work off the event loop
+
+Query embedding, vector search and answer extraction are CPU-bound and
+blocking. Running them on the event loop stalls every other request,
+including /health, so the API hands them to this executor instead.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+
+
+class QueryQueueFull(Exception):
+    """Raised when more queries are waiting than the executor accepts"""
+
+
+class QueryExecutor:
+    def __init__(self, max_workers: int = None, max_queue: int = None):
+        """
+        Args:
+            max_workers: Queries run concurrently (default: QUERY_WORKERS or min(4, CPU count))
+            max_queue: Queries allowed to wait for a worker (default: QUERY_QUEUE_LIMIT or 64)
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv("QUERY_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+        if max_queue is None:
+            max_queue = int(os.getenv("QUERY_QUEUE_LIMIT", "64"))
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="query")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Queries running or waiting for a worker"""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Queries waiting for a worker"""
+        return max(0, self._in_flight - self.max_workers)
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run func in the pool and await its result, rejecting work beyond the queue limit"""
+        return await self.submit(func, *args, **kwargs)
+
+    def submit(self, func: Callable, *args, **kwargs) -> asyncio.Future:
+        """
+        Start func in the pool and return an awaitable for its result
+
+        Raises QueryQueueFull right away (not when awaited), so a caller can
+        still answer 503 before it starts a streaming response.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise QueryQueueFull(f"{self._in_flight} queries already in flight")
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(partial(func, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        # Released when the work finishes, even if the awaiting request was cancelled
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,173 @@
+"""
+Versioned index directories for zero-downtime rebuilds
+
+A rebuild writes a complete new index under <root>/versions/<name> while
+the live one keeps serving. <root>/index_versions.json names the current
+and previous versions and is replaced atomically, so a restart (or another
+worker) always opens a complete index. An index built directly in <root>
+before versioning existed is the version named ".".
+
+DrainGate lets queries run concurrently while a swap to another version
+waits for the running ones to finish and holds new ones back.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from services.ingestion import load_manifest
+from services.page_text_cache import TEXT_CACHE_DIR
+
+POINTER_FILE = "index_versions.json"
+VERSIONS_DIR = "versions"
+
+# The index built directly in the root directory (before versioned rebuilds)
+LEGACY_VERSION = "."
+
+# Root entries that belong to no single version
+SHARED_ENTRIES = (VERSIONS_DIR, POINTER_FILE, TEXT_CACHE_DIR)
+
+
+class IndexVersions:
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    @property
+    def pointer_path(self) -> Path:
+        return self.root / POINTER_FILE
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def current(self) -> str:
+        return self._read().get("current", LEGACY_VERSION)
+
+    def previous(self) -> Optional[str]:
+        return self._read().get("previous")
+
+    def path(self, name: str) -> Path:
+        return self.root if name == LEGACY_VERSION else self.root / VERSIONS_DIR / name
+
+    def current_path(self) -> Path:
+        """Directory of the version being served"""
+        return self.path(self.current())
+
+    def _has_legacy_index(self) -> bool:
+        return self.root.exists() and any(
+            entry.name not in SHARED_ENTRIES for entry in self.root.iterdir())
+
+    def names(self) -> List[str]:
+        """All versions, oldest first"""
+        versions_dir = self.root / VERSIONS_DIR
+        names = sorted(entry.name for entry in versions_dir.iterdir() if entry.is_dir()) if versions_dir.exists() else []
+        return ([LEGACY_VERSION] if self._has_legacy_index() else []) + names
+
+    def create(self, seed_from: Optional[str] = None) -> str:
+        """
+        A new, not yet active version directory
+
+        With seed_from, the new version starts as a copy of that version,
+        so the incremental build only re-embeds PDFs that changed.
+        """
+        name = time.strftime("v%Y%m%d-%H%M%S")
+        suffix = 1
+        while self.path(name).exists():
+            suffix += 1
+            name = f"{time.strftime('v%Y%m%d-%H%M%S')}-{suffix}"
+        target = self.path(name)
+        source = self.path(seed_from) if seed_from is not None else None
+        if source is not None and source.exists():
+            def skip_versioning(directory, entries):
+                return list(SHARED_ENTRIES) if Path(directory) == self.root else []
+            shutil.copytree(source, target, ignore=skip_versioning)
+        else:
+            target.mkdir(parents=True)
+        return name
+
+    def activate(self, name: str):
+        """Make name the current version (the old current one becomes previous), atomically"""
+        state = self._read()
+        current = state.get("current", LEGACY_VERSION)
+        if current != name:
+            state["previous"] = current
+        state["current"] = name
+        state["activated_at"] = time.time()
+        temporary = self.pointer_path.with_suffix(".tmp")
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.pointer_path)
+
+    def describe(self) -> List[Dict]:
+        """Each version with its build state, index version and chunk count"""
+        state = self._read()
+        current = state.get("current", LEGACY_VERSION)
+        versions = []
+        for name in self.names():
+            manifest = load_manifest(str(self.path(name))) or {}
+            versions.append({
+                "name": name,
+                "current": name == current,
+                "previous": name == state.get("previous"),
+                "complete": manifest.get("complete", False),
+                "index_version": manifest.get("version"),
+                "chunks": sum(len(entry["chunk_ids"]) for entry in manifest.get("files", {}).values()),
+            })
+        return versions
+
+    def prune(self, keep: int) -> List[str]:
+        """Delete the oldest versions beyond keep; never the current, previous or legacy one"""
+        state = self._read()
+        protected = {state.get("current", LEGACY_VERSION), state.get("previous"), LEGACY_VERSION}
+        names = self.names()
+        removable = [name for name in names if name not in protected]
+        removed = removable[:max(0, len(names) - keep)]
+        for name in removed:
+            shutil.rmtree(self.path(name), ignore_errors=True)
+        return removed
+
+
+class DrainGate:
+    """Queries run concurrently; exclusive() waits for running ones and holds new ones back"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = 0
+        self._draining = False
+
+    @contextmanager
+    def query(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._draining)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                if not self._active:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._draining)
+            self._draining = True
+            self._condition.wait_for(lambda: self._active == 0)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._draining = False
+                self._condition.notify_all()
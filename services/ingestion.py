@@ -0,0 +1,293 @@
+"""
+Ingestion helpers used when building the vector store
+
+Parsing runs in a process pool so PDFs are spread across cores. Very large
+textbooks are split into page ranges so a single book doesn't keep one worker
+busy while the rest of the pool sits idle. Results are always yielded in
+file/page order, so the splitter sees the same input on every rebuild.
+With a page text cache, PDFs that were parsed before aren't parsed again.
+
+Chunks are then written in batches. A manifest records each PDF's content
+hash and the chunk IDs committed for it, so rebuilds only touch PDFs that
+changed and an interrupted build resumes after its last committed batch.
+Batches are checkpointed by appending to a journal next to the manifest,
+so a checkpoint costs the size of the batch, not of the whole manifest.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Pages handed to a worker in one task
+DEFAULT_PAGES_PER_TASK = 200
+
+# Chunks embedded and written to the store per batch
+DEFAULT_BATCH_SIZE = 256
+
+# Maps each PDF's content hash to the IDs of its chunks in the store
+MANIFEST_FILE = "ingest_manifest.json"
+
+# Per-file changes since the manifest was last saved, one JSON line each
+MANIFEST_JOURNAL_FILE = "ingest_manifest.journal"
+
+
+class ParsedRange(NamedTuple):
+    """Text of a contiguous page range from one PDF"""
+    pdf_file: Path
+    start_page: int
+    pages: List[str]
+    error: Optional[str] = None
+
+
+def get_ingest_workers(workers: int = None) -> int:
+    """Resolve the parse pool size from the argument, INGEST_WORKERS or the CPU count"""
+    if workers is None:
+        workers = int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+    return max(1, workers)
+
+
+def get_pages_per_task(pages_per_task: int = None) -> int:
+    """Resolve the page range size from the argument or INGEST_PAGES_PER_TASK"""
+    if pages_per_task is None:
+        pages_per_task = int(os.getenv("INGEST_PAGES_PER_TASK", DEFAULT_PAGES_PER_TASK))
+    return max(1, pages_per_task)
+
+
+def plan_parse_tasks(pdf_files: List[Path], pages_per_task: int) -> List[Tuple[str, int, int]]:
+    """Split PDFs into (path, start_page, end_page) tasks in file/page order"""
+    # Imported here so the serving path (which only reads the manifest) never loads pypdf
+    from pypdf import PdfReader
+    
+    tasks = []
+    for pdf_file in pdf_files:
+        try:
+            page_count = len(PdfReader(str(pdf_file)).pages)
+        except Exception:
+            # Let the worker hit (and report) the same error
+            page_count = 1
+        for start in range(0, max(page_count, 1), pages_per_task):
+            tasks.append((str(pdf_file), start, min(start + pages_per_task, page_count)))
+    return tasks
+
+
+def parse_page_range(task: Tuple[str, int, int]) -> List[str]:
+    """Extract the text of one page range (runs inside a pool worker)"""
+    from pypdf import PdfReader
+    
+    path, start, end = task
+    reader = PdfReader(path)
+    # Same extraction PyPDFLoader uses, so chunks match the old loader
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+def _safe_parse(task: Tuple[str, int, int]) -> Tuple[List[str], Optional[str]]:
+    try:
+        return parse_page_range(task), None
+    except Exception as e:
+        return [], str(e)
+
+
+def iter_parsed_ranges(pdf_files: List[Path], workers: int = None, pages_per_task: int = None,
+                       text_cache=None, hashes: Dict[Path, str] = None) -> Iterator[ParsedRange]:
+    """
+    Parse PDFs in parallel and yield page ranges in deterministic order
+
+    At most a few tasks per worker are in flight at once, so memory stays
+    bounded even when the consumer is slower than the pool.
+
+    With a text_cache (a PageTextCache), PDFs whose content hash (from
+    hashes, or computed here) is cached are read from it in the same page
+    ranges instead of being opened at all, and every PDF that parses
+    without errors is added to it.
+    """
+    pages_per_task = get_pages_per_task(pages_per_task)
+    if text_cache is None:
+        yield from _parse_ranges(pdf_files, workers, pages_per_task)
+        return
+
+    hashes = {pdf_file: (hashes or {}).get(pdf_file) or file_sha256(pdf_file) for pdf_file in pdf_files}
+    cached_pages = {pdf_file: text_cache.page_count(hashes[pdf_file]) for pdf_file in pdf_files}
+    to_parse = [pdf_file for pdf_file in pdf_files if cached_pages[pdf_file] is None]
+    parsed = groupby(_parse_ranges(to_parse, workers, pages_per_task), key=lambda r: r.pdf_file)
+
+    for pdf_file in pdf_files:
+        sha256 = hashes[pdf_file]
+        page_count = cached_pages[pdf_file]
+        if page_count is not None:
+            text_cache.hits += 1
+            for start in range(0, max(page_count, 1), pages_per_task):
+                end = min(start + pages_per_task, page_count)
+                pages = text_cache.load(sha256, start, end)
+                if pages is None:
+                    # Unreadable after all: parse this range instead
+                    pages, error = _safe_parse((str(pdf_file), start, end))
+                    yield ParsedRange(pdf_file, start, pages, error)
+                else:
+                    yield ParsedRange(pdf_file, start, pages)
+            continue
+
+        writer = text_cache.writer(sha256)
+        complete = True
+        for parsed_range in next(parsed)[1]:
+            yield parsed_range
+            writer.add(parsed_range.pages)
+            complete = complete and parsed_range.error is None
+        if complete:
+            writer.commit()
+
+
+def _pool_context():
+    """
+    Start method for the parse pool
+
+    Never a plain fork: the caller may be the live, multi-threaded API
+    (admin rebuilds), and a forked child can deadlock on locks other threads
+    held. The fork server is a fresh single-threaded process that imports
+    the caller's __main__ and this module once, then forks the workers
+    from that. Both start methods import __main__ in the workers, so a
+    script that builds an index must keep its work under a
+    `if __name__ == "__main__":` guard; preloading it in the fork server
+    at least imports it once rather than once per worker.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["__main__", __name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _parse_ranges(pdf_files: List[Path], workers: int, pages_per_task: int) -> Iterator[ParsedRange]:
+    workers = get_ingest_workers(workers)
+    tasks = plan_parse_tasks(pdf_files, pages_per_task)
+
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            pages, error = _safe_parse(task)
+            yield ParsedRange(Path(task[0]), task[1], pages, error)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=_pool_context()) as executor:
+        task_iter = iter(tasks)
+        pending = deque((task, executor.submit(_safe_parse, task))
+                        for task in islice(task_iter, workers * 2))
+        while pending:
+            task, future = pending.popleft()
+            next_task = next(task_iter, None)
+            if next_task is not None:
+                pending.append((next_task, executor.submit(_safe_parse, next_task)))
+            pages, error = future.result()
+            yield ParsedRange(Path(task[0]), task[1], pages, error)
+
+
+def chunk_ids(splits: List) -> List[str]:
+    """Deterministic IDs for the chunks of one page range: source:page:index"""
+    ids = []
+    counters = {}
+    for split in splits:
+        key = (split.metadata.get('source'), split.metadata.get('page'))
+        index = counters.get(key, 0)
+        counters[key] = index + 1
+        ids.append(f"{key[0]}:{key[1]}:{index}")
+    return ids
+
+
+def get_ingest_batch_size(batch_size: int = None) -> int:
+    """Resolve the write batch size from the argument or INGEST_BATCH_SIZE"""
+    if batch_size is None:
+        batch_size = int(os.getenv("INGEST_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    return max(1, batch_size)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most batch_size items"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def file_sha256(pdf_file: Path, entry: Optional[Dict] = None) -> str:
+    """
+    Content hash of a PDF
+
+    If the manifest entry was recorded for the same size and mtime, its hash
+    is reused, so a no-op rebuild doesn't have to re-read every textbook.
+    """
+    stat = pdf_file.stat()
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return entry["sha256"]
+    digest = hashlib.sha256()
+    with open(pdf_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def new_manifest(splitter: Dict) -> Dict:
+    """Empty manifest for a store built with the given splitter settings"""
+    return {"version": 0, "complete": False, "splitter": splitter, "files": {}}
+
+
+def load_manifest(persist_directory: str) -> Optional[Dict]:
+    """Read the ingestion manifest with its journal applied, or None if there isn't one"""
+    path = Path(persist_directory) / MANIFEST_FILE
+    try:
+        manifest = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    try:
+        with open(Path(persist_directory) / MANIFEST_JOURNAL_FILE) as f:
+            lines = f.readlines()
+    except OSError:
+        lines = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break  # Torn last line of an interrupted build
+        entry = manifest["files"].get(record["file"])
+        if entry is None:
+            continue
+        if "chunk_ids" in record:
+            if len(entry["chunk_ids"]) < record["offset"]:
+                break
+            # Replaying a batch twice leaves the same IDs in place
+            entry["chunk_ids"][record["offset"]:] = record["chunk_ids"]
+        entry.update(record.get("set", {}))
+    return manifest
+
+
+def save_manifest(persist_directory: str, manifest: Dict):
+    """Atomically replace the ingestion manifest and drop the journal it now includes"""
+    path = Path(persist_directory) / MANIFEST_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    # Journal first: a crash in between loses checkpoints (re-embedded by upsert), never applies stale ones
+    (path.parent / MANIFEST_JOURNAL_FILE).unlink(missing_ok=True)
+    os.replace(tmp_path, path)
+
+
+def journal_manifest_update(persist_directory: str, name: str, offset: int = None,
+                            chunk_ids: List[str] = None, **fields):
+    """
+    Checkpoint a change to one file's manifest entry without rewriting the manifest
+
+    chunk_ids replace the entry's IDs from offset on (a committed batch);
+    fields are set on the entry (e.g. complete=True).
+    """
+    record = {"file": name}
+    if chunk_ids is not None:
+        record.update(offset=offset, chunk_ids=chunk_ids)
+    if fields:
+        record["set"] = fields
+    with open(Path(persist_directory) / MANIFEST_JOURNAL_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
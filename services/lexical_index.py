@@ -0,0 +1,189 @@
+"""
+BM25 lexical index for hybrid retrieval
+
+MiniLM embeds exact terms (drug names, eponyms, abbreviations) poorly, so
+chunks are also indexed by the words they contain. The inverted index is
+stored as flat arrays next to the vector store: for every term a
+[start, count] range into a postings array of chunk numbers and a parallel
+array of term frequencies. The arrays are memory-mapped, so a lookup only
+touches the postings of the query's terms.
+
+Vector and BM25 rankings are combined with reciprocal rank fusion.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Names the array files of the current generation and holds the vocabulary.
+# Replacing this one file switches to a new index atomically.
+INDEX_FILE = "lexical_index.json"
+
+# Rank constant of reciprocal rank fusion (from the original RRF paper)
+RRF_K = 60
+
+_WORD = re.compile(r"\w+")
+
+# Question words and glue that carry no meaning for retrieval
+STOPWORDS = frozenset("""
+a about an and are as at be been but by can do does for from has have how if in into is it its
+of on or should so than that the their them then there these they this to was were what when
+where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words, keeping short ones like "hiv" or "b12" but dropping stopwords"""
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Merge ranked ID lists into (id, score) pairs, best first, scoring each ID sum(1 / (k + rank))"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class BM25Index:
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75):
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self.index_version = None
+        self.doc_ids = []
+        self.terms = {}           # term -> [start, count] into postings/frequencies
+        self.postings = None      # int32 chunk numbers, grouped by term
+        self.frequencies = None   # uint16 term frequencies, parallel to postings
+        self.doc_lengths = None   # int32 tokens per chunk
+        self.avg_doc_length = 0.0
+        self.load()
+
+    def load(self):
+        """(Re)open the index on disk; a missing or unreadable index is empty"""
+        self.index_version = None
+        self.doc_ids = []
+        self.terms = {}
+        self.postings = self.frequencies = self.doc_lengths = None
+        try:
+            info = json.loads((self.directory / INDEX_FILE).read_text())
+            prefix = info["prefix"]
+            arrays = [
+                np.load(self.directory / f"{prefix}.{name}.npy", mmap_mode="r")
+                for name in ("postings", "frequencies", "doc_lengths")
+            ]
+        except (OSError, ValueError, KeyError):
+            return
+        self.postings, self.frequencies, self.doc_lengths = arrays
+        self.index_version = info["index_version"]
+        self.doc_ids = info["doc_ids"]
+        self.terms = info["terms"]
+        self.avg_doc_length = info["avg_doc_length"]
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.doc_ids
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top k (chunk_id, BM25 score) pairs for the query, best first"""
+        if self.is_empty:
+            return []
+        total_docs = len(self.doc_ids)
+        doc_parts = []
+        score_parts = []
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, count = entry
+            docs = self.postings[start:start + count]
+            tf = self.frequencies[start:start + count].astype(np.float32)
+            idf = np.log(1 + (total_docs - count + 0.5) / (count + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not doc_parts:
+            return []
+
+        # Sum the per-term scores of each chunk
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if len(totals) > k:
+            top = np.argpartition(-totals, k)[:k]
+            top = top[np.argsort(-totals[top], kind="stable")]
+        else:
+            top = np.argsort(-totals, kind="stable")
+        return [(self.doc_ids[docs[i]], float(totals[i])) for i in top]
+
+    def build(self, chunks: Iterable[Tuple[str, str]], index_version: int):
+        """
+        Replace the index with one built from (chunk_id, text) pairs
+
+        Arrays are written under a new generation name and the index file is
+        swapped last, so readers never see a half written index.
+        """
+        vocabulary = {}
+        doc_ids = []
+        doc_lengths = []
+        term_parts = []
+        doc_parts = []
+        frequency_parts = []
+        for chunk_id, text in chunks:
+            counts = Counter(tokenize(text))
+            doc = len(doc_ids)
+            doc_ids.append(chunk_id)
+            doc_lengths.append(sum(counts.values()))
+            term_parts.append(np.fromiter(
+                (vocabulary.setdefault(term, len(vocabulary)) for term in counts), np.int32, len(counts)
+            ))
+            doc_parts.append(np.full(len(counts), doc, dtype=np.int32))
+            frequency_parts.append(np.fromiter(counts.values(), np.int64, len(counts)))
+
+        # Group postings by term, in chunk order within a term
+        term_numbers = np.concatenate(term_parts) if term_parts else np.zeros(0, np.int32)
+        order = np.argsort(term_numbers, kind="stable")
+        postings = np.concatenate(doc_parts)[order] if doc_parts else np.zeros(0, np.int32)
+        frequencies = np.concatenate(frequency_parts)[order] if frequency_parts else np.zeros(0, np.int64)
+        frequencies = np.minimum(frequencies, np.iinfo(np.uint16).max).astype(np.uint16)
+        counts = np.bincount(term_numbers, minlength=len(vocabulary))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else counts
+        terms = {term: [int(starts[n]), int(counts[n])] for term, n in vocabulary.items()}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        generation = 1 + max(
+            [int(p.name.split(".")[0].rsplit("-", 1)[1]) for p in self.directory.glob("lexical-*.postings.npy")] or [0]
+        )
+        prefix = f"lexical-{generation}"
+        np.save(self.directory / f"{prefix}.postings.npy", postings)
+        np.save(self.directory / f"{prefix}.frequencies.npy", frequencies)
+        np.save(self.directory / f"{prefix}.doc_lengths.npy", np.asarray(doc_lengths, dtype=np.int32))
+
+        tmp_path = self.directory / (INDEX_FILE + ".tmp")
+        tmp_path.write_text(json.dumps({
+            "prefix": prefix,
+            "index_version": index_version,
+            "doc_ids": doc_ids,
+            "avg_doc_length": max(1.0, float(np.mean(doc_lengths))) if doc_lengths else 1.0,
+            "terms": terms
+        }))
+        os.replace(tmp_path, self.directory / INDEX_FILE)
+
+        # Older generations are no longer referenced
+        for path in self.directory.glob("lexical-*.npy"):
+            if not path.name.startswith(prefix + "."):
+                path.unlink()
+        self.load()
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": len(self.doc_ids),
+            "terms": len(self.terms),
+            "postings": 0 if self.postings is None else int(self.postings.shape[0]),
+            "index_version": self.index_version
+        }
@@ -0,0 +1,200 @@
+"""
+Prometheus metrics
+
+Per-stage query latency histograms and error counters are recorded on the
+hot path (a perf_counter pair, a bisect and a locked increment per stage).
+Cache, initialization, index and executor figures are read from the
+service only when /metrics is scraped. Rendered in the Prometheus text
+exposition format, so no client library is needed.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.embeddings import CachedQueryEmbeddings, MicroBatchingEmbeddings
+from services.tracing import current_trace
+
+# Upper bounds in seconds: sub-millisecond stages (cache, BM25) up to slow model loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASES = ("not_started", "loading_model", "opening_index", "building_index", "warming_up", "ready", "failed")
+
+# (name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Latency histogram with one series per value of a single label"""
+
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label value -> [bucket counts (non-cumulative, last is +Inf), sum]
+
+    def observe(self, label_value: str, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    @contextmanager
+    def time(self, label_value: str):
+        """Observe how long the enclosed block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: (list(counts), total) for value, (counts, total) in self._series.items()}
+        for value, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels({self.label: value, "le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels({self.label: value})
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class StageHistogram(Histogram):
+    """Histogram whose observations also go to the trace active on the thread (see services.tracing)"""
+
+    def observe(self, label_value: str, seconds: float):
+        super().observe(label_value, seconds)
+        trace = current_trace()
+        if trace is not None:
+            trace.add(label_value, seconds)
+
+
+class Counter:
+    """Monotonic counter, optionally with one series per value of a single label"""
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._lock = threading.Lock()
+        # An unlabeled counter is exported as 0 before its first increment
+        self._values = {} if label else {None: 0}
+
+    def inc(self, label_value: str = None, amount: float = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for value, count in sorted(values.items(), key=lambda item: str(item[0])):
+            labels = _format_labels({self.label: value} if self.label else {})
+            lines.append(f"{self.name}{labels} {_format_value(count)}")
+        return lines
+
+
+# Recorded by RAGService and the API
+stage_seconds = StageHistogram("rag_stage_duration_seconds", "Time spent in each query pipeline stage", "stage")
+query_seconds = Histogram("rag_query_duration_seconds", "End-to-end query time by outcome", "outcome")
+query_errors = Counter("rag_query_errors_total", "Queries that failed with an exception", "method")
+queries_rejected = Counter("rag_queries_rejected_total", "Queries answered 503 because the executor queue was full")
+
+RECORDED = (stage_seconds, query_seconds, query_errors, queries_rejected)
+
+
+def service_metrics(service, executor=None) -> List[Family]:
+    """Metric families read from a RAGService (None while it loads) and the query executor"""
+    families = []
+    if executor is not None:
+        families += [
+            ("rag_executor_in_flight", "gauge", "Queries running or waiting for a worker", [({}, executor.in_flight)]),
+            ("rag_executor_queue_depth", "gauge", "Queries waiting for a worker", [({}, executor.queue_depth)]),
+            ("rag_executor_workers", "gauge", "Query worker threads", [({}, executor.max_workers)]),
+        ]
+    phase = service.phase if service is not None else "loading_model"
+    families += [
+        ("rag_ready", "gauge", "1 once queries can be answered", [({}, int(phase == "ready"))]),
+        ("rag_initialization_phase", "gauge", "Current initialization phase (1 for the active one)",
+         [({"phase": name}, int(name == phase)) for name in PHASES]),
+    ]
+    if service is None:
+        return families
+
+    progress = [({"counter": name}, value) for name, value in service.progress.items()
+                if isinstance(value, (int, float))]
+    if progress:
+        families.append(("rag_initialization_progress", "gauge", "Index build progress counters", progress))
+
+    if service.vectorstore is not None:
+        try:
+            chunks = service.vectorstore.count()
+        except Exception:
+            chunks = None
+        if chunks is not None:
+            families.append(("rag_index_chunks", "gauge", "Chunks in the vector store", [({}, chunks)]))
+    if service.index_version is not None:
+        families.append(("rag_index_version", "gauge", "Index version served", [({}, service.index_version)]))
+
+    answer_cache = service.answer_cache.stats()
+    families += [
+        ("rag_answer_cache_hits_total", "counter", "Semantic answer cache hits", [({}, answer_cache["hits"])]),
+        ("rag_answer_cache_misses_total", "counter", "Semantic answer cache misses", [({}, answer_cache["misses"])]),
+        ("rag_answer_cache_entries", "gauge", "Live semantic answer cache entries", [({}, answer_cache["entries"])]),
+    ]
+    embeddings = service.embeddings
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        query_cache = embeddings.stats()
+        families += [
+            ("rag_embedding_cache_hits_total", "counter", "Query embedding cache hits", [({}, query_cache["hits"])]),
+            ("rag_embedding_cache_misses_total", "counter", "Query embedding cache misses",
+             [({}, query_cache["misses"])]),
+            ("rag_embedding_cache_bytes", "gauge", "Query embedding cache memory", [({}, query_cache["bytes"])]),
+        ]
+        embeddings = embeddings.embeddings
+    if isinstance(embeddings, MicroBatchingEmbeddings):
+        batcher = embeddings.stats()
+        families += [
+            ("rag_embed_batches_total", "counter", "Model calls made by the query micro-batcher",
+             [({}, batcher["batches"])]),
+            ("rag_embed_batched_queries_total", "counter", "Queries encoded by the micro-batcher",
+             [({}, batcher["queries"])]),
+        ]
+    return families
+
+
+def render(families: Iterable[Family] = ()) -> str:
+    """Recorded metrics plus the given families in the Prometheus text format"""
+    lines = []
+    for metric in RECORDED:
+        lines += metric.render()
+    for name, kind, help, samples in families:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,123 @@
+"""
+On-disk cache of extracted PDF page text
+
+Text extraction is the slowest part of ingestion, and its output depends
+only on the PDF's bytes and the extractor. Each parsed PDF is stored once
+under <cache>/<extractor>/<sha256>.pages, so incremental rebuilds,
+re-chunking with other splitter settings and full rebuilds into a new index
+version skip parsing for every PDF that was extracted before.
+
+File format (little-endian):
+
+    "PGTX" | page count n (uint32) | n + 1 data offsets (uint64)
+    | each page's UTF-8 text, zlib-compressed, back to back
+
+Page i is data[offsets[i]:offsets[i + 1]], so a page range is read with one
+seek and without decompressing the rest of the book.
+"""
+
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import List, Optional
+
+# Bump when the extraction itself changes, so cached text is extracted again
+TEXT_EXTRACTOR_VERSION = 1
+
+# Default cache directory inside the index root (shared by every index version)
+TEXT_CACHE_DIR = "pdf_text_cache"
+
+MAGIC = b"PGTX"
+_HEADER = struct.Struct("<4sI")
+
+
+def extractor_id() -> str:
+    """Names the extractor the cached text came from: pypdf's version plus TEXT_EXTRACTOR_VERSION"""
+    import pypdf
+
+    return f"pypdf-{pypdf.__version__}-v{TEXT_EXTRACTOR_VERSION}"
+
+
+def create_text_cache(index_root: str) -> Optional["PageTextCache"]:
+    """The cache in PDF_TEXT_CACHE (default: <index_root>/pdf_text_cache), or None if it is 0"""
+    directory = os.getenv("PDF_TEXT_CACHE", "")
+    if directory == "0":
+        return None
+    return PageTextCache(directory or str(Path(index_root) / TEXT_CACHE_DIR))
+
+
+class PageTextCache:
+    def __init__(self, directory: str, extractor: str = None):
+        self.root = Path(directory)
+        # Resolved on first use, so the serving path never imports pypdf
+        self._extractor = extractor
+        self.hits = 0  # PDFs read from the cache instead of parsed
+
+    def _path(self, sha256: str) -> Path:
+        if self._extractor is None:
+            self._extractor = extractor_id()
+        return self.root / self._extractor / f"{sha256}.pages"
+
+    def _read_offsets(self, f) -> List[int]:
+        magic, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("not a page text file")
+        return list(struct.unpack(f"<{count + 1}Q", f.read(8 * (count + 1))))
+
+    def page_count(self, sha256: str) -> Optional[int]:
+        """Pages cached for the PDF with this content hash, or None if it isn't cached (or is truncated)"""
+        try:
+            with open(self._path(sha256), "rb") as f:
+                offsets = self._read_offsets(f)
+                data_size = os.fstat(f.fileno()).st_size - f.tell()
+        except (OSError, ValueError, struct.error):
+            return None
+        return len(offsets) - 1 if data_size == offsets[-1] else None
+
+    def load(self, sha256: str, start: int, end: int) -> Optional[List[str]]:
+        """Text of pages start..end-1, or None if they can't be read"""
+        try:
+            with open(self._path(sha256), "rb") as f:
+                offsets = self._read_offsets(f)
+                if not 0 <= start <= end < len(offsets):
+                    return None
+                f.seek(offsets[start], os.SEEK_CUR)
+                data = f.read(offsets[end] - offsets[start])
+            base = offsets[start]
+            return [
+                zlib.decompress(data[offsets[i] - base:offsets[i + 1] - base]).decode("utf-8")
+                for i in range(start, end)
+            ]
+        except (OSError, ValueError, struct.error, zlib.error):
+            return None
+
+    def writer(self, sha256: str) -> "PageTextWriter":
+        """Collects a PDF's pages in order; commit() stores them"""
+        return PageTextWriter(self._path(sha256))
+
+
+class PageTextWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self._pages = []  # compressed as they arrive, so a whole textbook is held at a fraction of its size
+
+    def add(self, pages: List[str]):
+        self._pages.extend(zlib.compress(text.encode("utf-8")) for text in pages)
+
+    def commit(self):
+        """Write the file atomically; write errors are printed, not raised"""
+        offsets = [0]
+        for page in self._pages:
+            offsets.append(offsets[-1] + len(page))
+        tmp_path = self.path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, len(self._pages)))
+                f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+                f.writelines(self._pages)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Could not write page text cache {self.path}: {e}")
+            tmp_path.unlink(missing_ok=True)
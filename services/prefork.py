@@ -0,0 +1,123 @@
+"""
+Pre-fork multi-worker serving
+
+The parent process loads the embedding model (and, with the numpy vector
+backend, the memory-mapped indexes) once, binds the listening socket and
+then forks the uvicorn workers. Pages loaded before the fork are shared
+copy-on-write, so each extra worker only costs its own Python heap
+instead of another copy of the model and index.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Dict, List
+
+from services.embeddings import restart_batchers
+
+# Seconds before a crashed worker is replaced (avoids a tight respawn loop)
+RESPAWN_DELAY = 1.0
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """Rss, Pss (shared pages split between the processes using them) and private kB of a process (Linux)"""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    usage[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return {}
+    usage["Private"] = usage.pop("Private_Clean", 0) + usage.pop("Private_Dirty", 0)
+    return usage
+
+
+def print_memory_report(parent: int, workers: List[int]):
+    """Per-process memory: a worker's Private is what it adds on top of the shared parent"""
+    print("🧠 Memory (MB)     Rss      Pss  Private")
+    for label, pid in [("parent", parent)] + [(f"worker {pid}", pid) for pid in workers]:
+        usage = memory_usage(pid)
+        if usage:
+            print(f"   {label:<12} {usage['Rss'] / 1024:7.1f} {usage['Pss'] / 1024:8.1f} {usage['Private'] / 1024:8.1f}")
+
+
+def _run_worker(app, sock: socket.socket):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app))
+    server.run(sockets=[sock])
+
+
+def serve_prefork(app, host: str, port: int, workers: int, memory_report_after: float = 30.0):
+    """
+    Serve app from `workers` forked processes sharing one listening socket
+
+    Call after everything that should be shared has been loaded. Crashed
+    workers are replaced; SIGTERM/SIGINT stop all of them. A per-process
+    memory report is printed memory_report_after seconds after startup
+    (0 disables it).
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Objects that exist now are never scanned by the workers' GC, so their
+    # pages aren't dirtied (and copied) just by garbage collection
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                # The parent's embedding batcher threads didn't survive the fork
+                restart_batchers()
+                _run_worker(app, sock)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    print(f"🚀 Serving on http://{host}:{port} with {workers} workers (parent pid {os.getpid()})")
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    report_at = time.monotonic() + memory_report_after if memory_report_after else None
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if report_at is not None and time.monotonic() >= report_at:
+                print_memory_report(os.getpid(), list(children))
+                report_at = None
+            time.sleep(0.2)
+            continue
+        children.pop(pid, None)
+        if not stopping:
+            print(f"⚠️  Worker {pid} exited with status {status}; starting a replacement")
+            time.sleep(RESPAWN_DELAY)
+            spawn()
+    sock.close()
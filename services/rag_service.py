@@ -1,26 +1,83 @@
 import os
 import pickle
+import re
 import threading
+import time
 from pathlib import Path
-from typing import Dict, List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.chains import RetrievalQA
-from langchain.llms import OpenAI
+from itertools import groupby, islice
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+import numpy as np
 from dotenv import load_dotenv
 
+from services.answer_cache import SemanticAnswerCache
+from services.embeddings import create_query_embeddings
+from services.index_versions import DrainGate, IndexVersions
+from services.ingestion import (
+    ParsedRange,
+    chunk_ids,
+    file_sha256,
+    get_ingest_batch_size,
+    get_ingest_workers,
+    iter_batches,
+    iter_parsed_ranges,
+    journal_manifest_update,
+    load_manifest,
+    new_manifest,
+    save_manifest,
+)
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from services.page_text_cache import create_text_cache
+from services.metrics import query_errors, query_seconds, stage_seconds
+from services.tracing import chunk_scores, current_trace
+from services.sentence_vectors import SentenceVectorIndex
+from services.vector_store import create_vector_store, get_vector_backend
+from services.startup import startup_timings
+from services.sentences import (
+    FALLBACK_HEADER,
+    HEADER,
+    METADATA_KEY as SENTENCE_INDEX_KEY,
+    SENTENCE_INDEX_VERSION,
+    dumps_sentence_index,
+    load_sentence_index,
+    query_tokens,
+)
+
 load_dotenv()
 
+# Where a streamed answer is split: after each ". " (answers are joined sentences)
+ANSWER_SENTENCE_BREAK = re.compile(r"(?<=\. )")
+
 class RAGService:
-    def __init__(self, data_path: str = None, persist_directory: str = "./chroma_db"):
+    # Score penalty per rank for sentences from lower-ranked chunks
+    CHUNK_RANK_PENALTY = 5
+    
+    # Score points per unit of sentence/query cosine similarity (0.1 ~ one matching word)
+    SENTENCE_SIMILARITY_WEIGHT = 100
+    
+    # Results taken from each retriever before hybrid fusion (at least top_k)
+    FUSION_DEPTH = 20
+    
+    # Run once the index is open, to load the model weights and index pages before the first real query
+    WARM_UP_QUERY = "What are the symptoms of diabetes?"
+    
+    INITIALIZING_ANSWER = "The medical knowledge base is currently being initialized. Please try again in a few minutes. This is a one-time process that takes approximately 10-15 minutes."
+    
+    def __init__(self, data_path: str = None, persist_directory: str = "./chroma_db",
+                 ingest_workers: int = None, ingest_pages_per_task: int = None,
+                 ingest_batch_size: int = None, auto_initialize: bool = True, vector_backend: str = None,
+                 embeddings=None):
         """
         Initialize the RAG service with document loading and retrieval
         
         Args:
             data_path: Path to medical documents
             persist_directory: Directory to store vector database
+            ingest_workers: PDF parser processes (default: INGEST_WORKERS or CPU count)
+            ingest_pages_per_task: Page range size for large PDFs (default: INGEST_PAGES_PER_TASK or 200)
+            ingest_batch_size: Chunks embedded and written per batch (default: INGEST_BATCH_SIZE or 256)
+            auto_initialize: Load or build the vector store right away (rebuild_vectorstore() does it on demand)
+            vector_backend: "chroma" or "numpy" (default: VECTOR_BACKEND or "chroma")
+            embeddings: Query embeddings to share with another service (default: a new model)
         """
         # Default data path if not provided
         if data_path is None:
@@ -40,24 +97,74 @@ class RAGService:
         else:
             self.data_path = Path(data_path)
             
-        self.persist_directory = persist_directory
+        # Index versions (rebuilt side by side, see start_rebuild) live under the root directory;
+        # this instance serves the current one
+        self.index_root = persist_directory
+        self.index_versions = IndexVersions(persist_directory)
+        self.persist_directory = str(self.index_versions.current_path())
+        self.ingest_workers = ingest_workers
+        self.ingest_pages_per_task = ingest_pages_per_task
+        self.ingest_batch_size = ingest_batch_size
+        # Extracted page text by PDF content hash, so rebuilds and re-chunking skip parsing (PDF_TEXT_CACHE=0 disables it)
+        self.text_cache = create_text_cache(self.index_root)
+        self.vector_backend = get_vector_backend(vector_backend)
+        # Changing any of these re-embeds every PDF on the next rebuild
+        self.splitter_settings = {
+            "chunk_size": 1000,
+            "chunk_overlap": 200,
+            "sentence_index": SENTENCE_INDEX_VERSION
+        }
         self.vectorstore = None
         self.qa_chain = None
         self.initialization_started = False
         self.initialization_complete = False
+        # Reported by status(): not_started, loading_model, opening_index,
+        # building_index, warming_up, ready or failed
+        self.phase = "loading_model"
+        self.progress = {}
+        self.initialization_error = None
+        self.warm_up_enabled = os.getenv("WARM_UP", "1") != "0"
         
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        # Initialize embeddings (cached, and concurrent queries are encoded in micro-batches)
+        if embeddings is None:
+            with startup_timings.phase("embedding_model"):
+                embeddings = create_query_embeddings()
+        self.embeddings = embeddings
+        
+        # Answers for paraphrased questions, dropped whenever the index version changes
+        self.answer_cache = SemanticAnswerCache()
+        self.index_version = None
+        
+        # Sentence embeddings for extractive answer selection (SENTENCE_VECTORS=0 skips building them)
+        self.sentence_vectors_enabled = os.getenv("SENTENCE_VECTORS", "1") != "0"
+        self.sentence_vectors = None
+        
+        # BM25 index fused with the vector search (HYBRID_SEARCH=0 searches vectors only)
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "1") != "0"
+        self.lexical_index = None
+        
+        # Queries hold the gate; switching index versions waits for them to drain
+        self._queries = DrainGate()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_service = None
+        self._watching = False
+        self.rebuild_state = {"state": "idle"}
         
         # Initialize LLM
         self.llm = self._init_llm()
         
         # Initialize or load vector store (try to load sync if exists, otherwise async)
-        if Path(self.persist_directory).exists() and any(Path(self.persist_directory).iterdir()):
+        self.phase = "not_started"
+        if auto_initialize:
+            self.initialize()
+    
+    def initialize(self):
+        """Load the vector store (and warm up), or start building it in the background"""
+        if self._has_complete_vectorstore():
             # Load existing vector store synchronously (should be fast)
+            self.initialization_started = True
             self._initialize_vectorstore()
+            self.initialization_complete = True
         else:
             # Start background initialization for new vector store
             self._initialize_vectorstore_in_background()
@@ -66,6 +173,8 @@ class RAGService:
         """Initialize LLM - use OpenAI if available, otherwise extract from context"""
         api_key = os.getenv("OPENAI_API_KEY")
         if api_key:
+            # Only needed with a key, and slow to import
+            from langchain.llms import OpenAI
             return OpenAI(openai_api_key=api_key, temperature=0)
         else:
             print("Warning: No OpenAI API key. Using simple context extraction.")
@@ -90,6 +199,8 @@ class RAGService:
     
     def _load_documents(self) -> List:
         """Load all PDF documents from the dataset directory"""
+        from langchain_community.document_loaders import PyPDFLoader
+        
         documents = []
         
         if not self.data_path.exists():
@@ -120,106 +231,301 @@ class RAGService:
         return documents
     
     def _create_vectorstore_with_incremental_loading(self):
-        """Create vector store by processing PDFs one by one"""
+        """
+        Build or incrementally update the vector store as a streaming pipeline
+        
+        The ingestion manifest maps each PDF's content hash (and the splitter
+        settings) to the IDs of its chunks. Unchanged PDFs are skipped, changed
+        PDFs are re-embedded and chunks of PDFs that left the dataset are
+        deleted, so a no-op rebuild only has to hash files.
+        
+        Changed PDFs are parsed, split, embedded and written to the store in
+        batches of ingest_batch_size chunks. Every committed batch is appended
+        to the manifest's journal (the manifest itself is rewritten once per
+        build), so a crashed build resumes from the last batch instead of
+        starting over, and memory stays flat regardless of corpus size.
+        """
         from langchain_text_splitters import RecursiveCharacterTextSplitter
         
         # Get PDF files
         pdf_files = list(self.data_path.glob("*.pdf"))
+        if not pdf_files:
+            # Never treat a missing dataset as "every PDF was removed"
+            raise ValueError(f"No PDF files found in {self.data_path}")
         
         # TEMPORARY: Use only 8 smallest PDFs for faster testing
         # Comment this out for full dataset
-        pdf_files = sorted(pdf_files, key=lambda x: x.stat().st_size)[:8]
+        # (name breaks size ties so the order - and the chunk IDs - are stable)
+        pdf_files = sorted(pdf_files, key=lambda x: (x.stat().st_size, x.name))[:8]
         
         total_files = len(pdf_files)
         print(f"⚠️  Using {total_files} PDFs (can increase to 9 for full dataset)")
         
-        print(f"Processing {total_files} PDF files individually...")
-        
-        # Check if vectorstore already exists - if so, we'll add to it
-        existing_chunks_count = 0
-        if Path(self.persist_directory).exists() and any(Path(self.persist_directory).iterdir()):
-            print("ℹ️  Existing vector store found. Will add new documents to it.")
-            # Load existing ChromaDB store
-            try:
-                existing_store = Chroma(
-                    persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings
-                )
-                existing_chunks_count = existing_store._collection.count() if hasattr(existing_store, '_collection') else 0
-            except Exception as e:
-                print(f"Could not load existing store: {e}")
-            if existing_chunks_count > 0:
-                print(f"ℹ️  Current chunks in store: {existing_chunks_count}")
+        workers = get_ingest_workers(self.ingest_workers)
+        batch_size = get_ingest_batch_size(self.ingest_batch_size)
         
         # Create text splitter
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=self.splitter_settings["chunk_size"],
+            chunk_overlap=self.splitter_settings["chunk_overlap"],
             length_function=len
         )
         
-        # Start with empty vector store (will add to it incrementally)
-        all_splits = []
+        # Open (or create) the store once and stream batches into it
+        self.vectorstore = create_vector_store(self.persist_directory, self.embeddings, self.vector_backend)
         
-        for idx, pdf_file in enumerate(pdf_files, 1):
-            try:
-                print(f"\n[{idx}/{total_files}] Processing {pdf_file.name}...")
+        manifest = load_manifest(self.persist_directory)
+        if manifest is None:
+            manifest = new_manifest(self.splitter_settings)
+            existing_chunks_count = self.vectorstore.count()
+            if existing_chunks_count > 0:
+                # Chunks from before the manifest can't be matched to files
+                print(f"ℹ️  Existing vector store has {existing_chunks_count} untracked chunks. Rebuilding it.")
+                self._delete_chunks(self.vectorstore.ids())
+        
+        settings_changed = manifest["splitter"] != self.splitter_settings
+        if settings_changed:
+            print("ℹ️  Chunking settings changed. Re-embedding every PDF.")
+        elif self._manifest_backend(manifest) != self.vector_backend:
+            # The other backend's chunks stay where they are; this one starts empty
+            print(f"ℹ️  Vector backend changed to {self.vector_backend}. Re-embedding every PDF.")
+            settings_changed = True
+        
+        files = manifest["files"]
+        current_names = {pdf_file.name for pdf_file in pdf_files}
+        changed = False
+        
+        # Drop chunks of PDFs that are no longer in the dataset
+        for name in [name for name in files if name not in current_names]:
+            print(f"🗑️  {name} removed from dataset: deleting {len(files[name]['chunk_ids'])} chunks")
+            self._delete_chunks(files.pop(name)["chunk_ids"])
+            changed = True
+        
+        to_process = []
+        for pdf_file in pdf_files:
+            entry = files.get(pdf_file.name)
+            sha256 = file_sha256(pdf_file, entry)
+            stat = pdf_file.stat()
+            if entry and entry["sha256"] == sha256 and not settings_changed and not entry.get("parse_failed"):
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                if not entry["complete"]:
+                    # Interrupted last time - resume after its committed chunks
+                    to_process.append(pdf_file)
+                continue
+            if entry and entry.get("parse_failed"):
+                print(f"ℹ️  {pdf_file.name} had parse errors last time: replacing {len(entry['chunk_ids'])} chunks")
+                self._delete_chunks(entry["chunk_ids"])
+            elif entry:
+                print(f"ℹ️  {pdf_file.name} changed: replacing {len(entry['chunk_ids'])} chunks")
+                self._delete_chunks(entry["chunk_ids"])
+            files[pdf_file.name] = {
+                "sha256": sha256,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "chunk_ids": [],
+                "complete": False,
+                # Chunk IDs are positional, so a re-processed file's old sentence rows must not be kept
+                "sentence_vectors": False
+            }
+            to_process.append(pdf_file)
+        
+        manifest["splitter"] = self.splitter_settings
+        manifest["vector_backend"] = self.vector_backend
+        
+        if to_process:
+            changed = True
+            manifest["complete"] = False
+            save_manifest(self.persist_directory, manifest)
+            
+            self.progress = {"step": "embedding_chunks", "files_total": len(to_process), "files_done": 0,
+                             "chunks_committed": 0}
+            print(f"Processing {len(to_process)} new or changed PDF files with {workers} parser processes...")
+            print("⏳ This may take 5-10 minutes for embedding generation...")
+            
+            # Page ranges arrive in file/page order no matter which worker parsed them
+            text_cache = self.text_cache
+            cache_hits = text_cache.hits if text_cache else 0
+            ranges = iter_parsed_ranges(to_process, workers, self.ingest_pages_per_task, text_cache,
+                                        {pdf_file: files[pdf_file.name]["sha256"] for pdf_file in to_process})
+            for pdf_file, file_ranges in groupby(ranges, key=lambda r: r.pdf_file):
+                entry = files[pdf_file.name]
+                committed = len(entry["chunk_ids"])
+                if committed:
+                    print(f"ℹ️  Resuming {pdf_file.name} after {committed} committed chunks")
                 
-                # Load single PDF - handle any metadata errors gracefully
-                try:
-                    loader = PyPDFLoader(str(pdf_file))
-                    docs = loader.load()
-                except Exception as pdf_error:
-                    # If PDF loading fails, try without metadata
-                    print(f"Warning: Error loading PDF metadata, continuing anyway: {pdf_error}")
-                    # Fallback: skip this file
-                    continue
+                # Already embedded and written before the interruption
+                failed_pages = []
+                chunks = islice(self._iter_chunks(file_ranges, text_splitter, failed_pages), committed, None)
+                for batch in iter_batches(chunks, batch_size):
+                    ids = [chunk_id for chunk_id, _ in batch]
+                    # Both backends upsert by ID, so replaying a half-written batch can't duplicate it
+                    self.vectorstore.add(ids, [doc.page_content for _, doc in batch], [doc.metadata for _, doc in batch])
+                    
+                    journal_manifest_update(self.persist_directory, pdf_file.name,
+                                            offset=len(entry["chunk_ids"]), chunk_ids=ids)
+                    entry["chunk_ids"].extend(ids)
+                    self.progress["chunks_committed"] += len(ids)
+                    print(f"💾 {pdf_file.name}: committed {len(entry['chunk_ids'])} chunks")
                 
+                done = {"complete": True}
+                if failed_pages:
+                    # Chunk IDs and the resume offset assume every range was parsed, so redo the whole file
+                    done["parse_failed"] = True
+                    print(f"⚠️  {pdf_file.name}: pages from {', '.join(map(str, failed_pages))} failed;"
+                          f" it will be parsed again on the next rebuild")
+                journal_manifest_update(self.persist_directory, pdf_file.name, **done)
+                entry.update(done)
+                self.progress["files_done"] += 1
+            if text_cache:
+                print(f"📄 Page text of {text_cache.hits - cache_hits} of {len(to_process)} PDFs read from the cache")
+        else:
+            print("ℹ️  All PDFs unchanged. Nothing to embed.")
+        
+        total_chunks = sum(len(entry["chunk_ids"]) for entry in files.values())
+        if total_chunks == 0:
+            raise ValueError("No documents were successfully processed")
+        
+        # Runs before the build is marked complete, so an interrupted sync resumes too
+        # Also finishes the compaction of a build interrupted after its last batch
+        self.vectorstore.compact()
+        
+        all_ids = [chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]]
+        self.progress["step"] = "sentence_vectors"
+        stale_ids = {chunk_id for entry in files.values() if not entry.get("sentence_vectors")
+                     for chunk_id in entry["chunk_ids"]}
+        if self._sync_sentence_vectors(all_ids, batch_size, stale_ids):
+            for entry in files.values():
+                entry["sentence_vectors"] = True
+        
+        if changed:
+            manifest["version"] += 1
+        self.progress["step"] = "lexical_index"
+        self._sync_lexical_index(all_ids, batch_size, manifest["version"])
+        manifest["complete"] = True
+        save_manifest(self.persist_directory, manifest)
+        self.index_version = manifest["version"]
+        
+        print(f"\n📊 Total chunks in store: {total_chunks}")
+        print("✅ Vector store created and persisted")
+        print("🎉 Initialization complete! API is ready.")
+    
+    def _sync_sentence_vectors(self, chunk_ids: List[str], batch_size: int, stale_ids: Set[str]) -> bool:
+        """
+        Embed the sentences of chunks that have no (or stale) sentence vectors and drop those of deleted chunks
+        
+        stale_ids are chunks rewritten by this build: their IDs may already be
+        indexed, but with the rows of the old text. Returns False when
+        sentence vectors are turned off.
+        """
+        if not self.sentence_vectors_enabled:
+            # Rows left from an earlier build may be stale; never rank with them
+            self.sentence_vectors = None
+            return False
+        self.sentence_vectors = SentenceVectorIndex(self.persist_directory)
+        
+        present = set(chunk_ids)
+        indexed = set(self.sentence_vectors.offsets) - stale_ids
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in indexed]
+        if not missing and indexed <= present:
+            return True
+        
+        print(f"Embedding sentences of {len(missing)} chunks...")
+        
+        def embed_missing():
+            for ids in iter_batches(missing, batch_size):
+                chunk_sentences = []
+                for chunk_id, text, metadata in self.vectorstore.get(ids):
+                    index = load_sentence_index(text, metadata)
+                    chunk_sentences.append((chunk_id, [
+                        text[start:end]
+                        for (start, end), flag in zip(index["spans"], index["flags"])
+                        if not flag & HEADER
+                    ]))
+                flat = [sentence for _, sentences in chunk_sentences for sentence in sentences]
+                vectors = self.embeddings.embed_documents(flat) if flat else []
+                position = 0
+                for chunk_id, sentences in chunk_sentences:
+                    yield chunk_id, vectors[position:position + len(sentences)]
+                    position += len(sentences)
+        
+        self.sentence_vectors.update(present & indexed, embed_missing())
+        print(f"✅ Sentence vectors: {self.sentence_vectors.stats()['sentences']} sentences")
+        return True
+    
+    def _sync_lexical_index(self, chunk_ids: List[str], batch_size: int, index_version: int):
+        """Rebuild the BM25 index from the stored chunks unless it was built for this index version"""
+        self.lexical_index = BM25Index(self.persist_directory)
+        if not self.hybrid_search or self.lexical_index.index_version == index_version:
+            return
+        
+        print(f"Building BM25 index over {len(chunk_ids)} chunks...")
+        
+        def stored_chunks():
+            for ids in iter_batches(chunk_ids, batch_size):
+                for chunk_id, text, _ in self.vectorstore.get(ids):
+                    yield chunk_id, text
+        
+        self.lexical_index.build(stored_chunks(), index_version)
+        print(f"✅ BM25 index: {self.lexical_index.stats()['terms']} terms")
+    
+    def _delete_chunks(self, ids: List[str]):
+        """Delete chunks from the store in batches Chroma accepts"""
+        for batch in iter_batches(ids, 5000):
+            self.vectorstore.delete(batch)
+    
+    def _iter_chunks(self, ranges: Iterable[ParsedRange], text_splitter,
+                     failed_pages: List[int] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Yield (chunk_id, chunk) pairs for parsed page ranges, in order
+        
+        Ranges that fail are skipped; their first page number is appended to failed_pages.
+        """
+        from langchain_core.documents import Document
+        
+        for parsed in ranges:
+            pdf_name = parsed.pdf_file.name
+            first_page = parsed.start_page + 1
+            last_page = parsed.start_page + len(parsed.pages)
+            
+            if parsed.error:
+                print(f"❌ Error processing {pdf_name} (from page {first_page}): {parsed.error}")
+                if failed_pages is not None:
+                    failed_pages.append(first_page)
+                continue
+            
+            try:
                 # Add source metadata manually
-                for doc in docs:
-                    doc.metadata['source'] = str(pdf_file.name)
+                docs = [
+                    Document(page_content=text, metadata={'source': pdf_name, 'page': parsed.start_page + i})
+                    for i, text in enumerate(parsed.pages)
+                ]
                 
-                # Split into chunks
+                # Split into chunks, each carrying its precomputed sentence index
                 splits = text_splitter.split_documents(docs)
-                all_splits.extend(splits)
-                
-                print(f"✅ {pdf_file.name} processed: {len(docs)} pages, {len(splits)} chunks")
-                
+                for split in splits:
+                    split.metadata[SENTENCE_INDEX_KEY] = dumps_sentence_index(split.page_content)
             except Exception as e:
-                print(f"❌ Error processing {pdf_file.name}: {e}")
+                print(f"❌ Error processing {pdf_name}: {e}")
+                if failed_pages is not None:
+                    failed_pages.append(first_page)
                 continue
-        
-        if not all_splits:
-            raise ValueError("No documents were successfully processed")
-        
-        print(f"\n📊 Total chunks created: {len(all_splits)}")
-        
-        # Check if we should add to existing or create new
-        vectorstore_path = Path(self.persist_directory)
-        if existing_chunks_count > 0:
-            print(f"Adding {len(all_splits)} new chunks to existing store ({existing_chunks_count} existing)...")
-            # Load existing
-            existing_vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
-            )
-            # Add new documents
-            existing_vectorstore.add_documents(all_splits)
-            self.vectorstore = existing_vectorstore
-            print(f"✅ Added to existing store. Total: {existing_chunks_count + len(all_splits)} chunks")
-        else:
-            print("Creating new vector store and generating embeddings...")
-            print("⏳ This may take 5-10 minutes for embedding generation...")
             
-            # Create vector store with all chunks
-            self.vectorstore = Chroma.from_documents(
-                documents=all_splits,
-                embedding=self.embeddings,
-                persist_directory=self.persist_directory
-            )
-            print("✅ Vector store created and persisted")
+            print(f"✅ {pdf_name} pages {first_page}-{last_page} processed: {len(splits)} chunks")
+            yield from zip(chunk_ids(splits), splits)
+    
+    def rebuild_vectorstore(self):
+        """
+        Bring the vector store in line with the dataset directory
         
-        print("🎉 Initialization complete! API is ready.")
+        Only new or changed PDFs are embedded and chunks of removed PDFs are
+        deleted, so this finishes in seconds when nothing changed.
+        
+        With more than one ingest worker, the parser processes import the
+        calling script's __main__ module (see services.ingestion), so a
+        script that calls this must keep its work under
+        `if __name__ == "__main__":`.
+        """
+        self._create_vectorstore_with_incremental_loading()
     
     def _initialize_vectorstore_in_background(self):
         """Start vector store initialization in background thread"""
@@ -239,142 +545,617 @@ class RAGService:
             print("Vector store initialization complete!")
         except Exception as e:
             print(f"Error initializing vector store: {e}")
+            self.phase = "failed"
+            self.initialization_error = f"Error initializing vector store: {e}"
             self.vectorstore = None
             self.qa_chain = None
     
+    def _has_complete_vectorstore(self) -> bool:
+        """True if a persisted store exists and its last build wasn't interrupted"""
+        vectorstore_path = Path(self.persist_directory)
+        if not (vectorstore_path.exists() and any(vectorstore_path.iterdir())):
+            return False
+        manifest = load_manifest(self.persist_directory)
+        # Stores built before the manifest existed have no manifest file
+        if manifest is None:
+            return self.vector_backend == "chroma"
+        return manifest.get("complete", False) and self._manifest_backend(manifest) == self.vector_backend
+    
+    @staticmethod
+    def _manifest_backend(manifest: Dict) -> str:
+        # Manifests written before backends were selectable describe Chroma stores
+        return manifest.get("vector_backend", "chroma")
+    
+    def _load_index_version(self) -> int:
+        """Version recorded by the last build (0 for stores built before the manifest)"""
+        manifest = load_manifest(self.persist_directory)
+        return manifest.get("version", 0) if manifest else 0
+    
     def _initialize_vectorstore(self):
         """Initialize or load the vector store"""
-        vectorstore_path = Path(self.persist_directory)
-        
         # Check if Dataset directory exists
         if not self.data_path.exists():
             print(f"⚠️ Dataset path {self.data_path} not found. API will start without ChromaDB.")
             print("Set DATASET_PATH environment variable or place Dataset in the project directory.")
             self.vectorstore = None
+            self.phase = "failed"
+            self.initialization_error = f"Dataset path {self.data_path} not found"
             return
         
         # Check if vector store already exists
-        if vectorstore_path.exists() and any(vectorstore_path.iterdir()):
+        if self._has_complete_vectorstore():
             try:
                 print(f"Loading existing vector store from {self.persist_directory}")
-                self.vectorstore = Chroma(
-                    persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings
-                )
+                self.phase = "opening_index"
+                with startup_timings.phase("index_open"):
+                    self.vectorstore = create_vector_store(self.persist_directory, self.embeddings, self.vector_backend)
+                    self.index_version = self._load_index_version()
+                    if self.sentence_vectors_enabled:
+                        self.sentence_vectors = SentenceVectorIndex(self.persist_directory)
+                    self.lexical_index = BM25Index(self.persist_directory)
                 print("Vector store loaded successfully")
             except Exception as e:
                 print(f"Error loading vector store: {e}")
                 self.vectorstore = None
+                self.initialization_error = f"Error loading vector store: {e}"
         else:
             print("Creating new vector store...")
+            self.phase = "building_index"
             try:
-                self._create_vectorstore_with_incremental_loading()
+                with startup_timings.phase("index_build"):
+                    self._create_vectorstore_with_incremental_loading()
             except Exception as e:
                 print(f"Error creating vector store: {e}")
                 self.vectorstore = None
+                self.initialization_error = f"Error creating vector store: {e}"
+        
+        if self.vectorstore is None:
+            self.phase = "failed"
+        else:
+            self.phase = "warming_up"
+            self.warm_up()
+            self.phase = "ready"
         
         # Note: We don't use QA chain anymore - we extract answers directly from contexts
         # This allows us to provide precise answers without OpenAI
         self.qa_chain = None
     
-    def get_answer(self, query: str, top_k: int = 5) -> Dict[str, List[str]]:
+    def warm_up(self):
         """
-        Get a SINGLE, PRECISE answer from ChromaDB
-        Returns answer from ONLY the best matching document - ONE reliable source
+        Run one query end to end so the first real one doesn't pay for lazy loading
+        
+        Bypasses the query and answer caches, so the warm-up query never
+        shows up as a cached answer. Failures are logged, not raised.
         """
-        # If vector store doesn't exist yet, return a helpful message
-        if self.vectorstore is None:
-            return {
-                "answer": "The medical knowledge base is currently being initialized. Please try again in a few minutes. This is a one-time process that takes approximately 10-15 minutes.",
-                "contexts": []
-            }
+        if not self.warm_up_enabled or self.vectorstore is None:
+            return
+        try:
+            with startup_timings.phase("warm_up"):
+                query_vector = self.embeddings.embed_documents([self.WARM_UP_QUERY])[0]
+                docs = self._search([query_vector], k=5, queries=[self.WARM_UP_QUERY])[0]
+                self._answer_from_docs(self.WARM_UP_QUERY, docs, False, query_vector)
+        except Exception as e:
+            print(f"⚠️  Warm-up query failed: {e}")
+    
+    def status(self) -> Dict:
+        """Initialization phase and progress, as reported by /ready"""
+        return {
+            "ready": self.phase == "ready",
+            "phase": self.phase,
+            "initialization_started": self.initialization_started,
+            "initialization_complete": self.initialization_complete,
+            "progress": dict(self.progress),
+            "index_version": self.index_version,
+            "error": self.initialization_error
+        }
+    
+    def start_rebuild(self, full: bool = False) -> bool:
+        """
+        Rebuild the index into a new version in the background, then switch to it
         
+        The current version keeps answering queries meanwhile. The new one
+        starts as a copy of the current version, so only changed PDFs are
+        re-embedded, unless full is set. Once it is built and warmed up,
+        queries drain and the service switches over; the old version stays
+        on disk for rollback(). Returns False if a rebuild is already running.
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False
+        self.rebuild_state = {"state": "starting", "full": full, "started_at": time.time()}
+        thread = threading.Thread(target=self._rebuild_thread, args=(full,), name="index-rebuild", daemon=True)
+        thread.start()
+        return True
+    
+    def _rebuild_thread(self, full: bool):
+        """Build, warm up and switch to a new index version"""
         try:
-            # Get ONLY the single best matching document (k=1 for one source)
-            docs = self.vectorstore.similarity_search_with_score(query, k=1)
+            seed = None if full else self.index_versions.current()
+            name = self.index_versions.create(seed_from=seed)
+            self.rebuild_state.update(state="building", version=name)
+            print(f"🔨 Building index version {name}...")
+            builder = self._version_service(name)
+            self._rebuild_service = builder
+            builder.rebuild_vectorstore()
+            
+            self.rebuild_state["state"] = "warming_up"
+            builder.warm_up()
             
-            if not docs:
+            self.rebuild_state["state"] = "switching"
+            self._switch_to(builder, name, activate=True)
+            keep = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+            removed = self.index_versions.prune(keep)
+            if removed:
+                print(f"🗑️  Removed old index versions: {', '.join(removed)}")
+            self.rebuild_state.update(state="complete", finished_at=time.time(), removed_versions=removed)
+        except Exception as e:
+            print(f"❌ Index rebuild failed: {e}")
+            self.rebuild_state.update(state="failed", finished_at=time.time(), error=str(e))
+        finally:
+            self._rebuild_service = None
+            self._rebuild_lock.release()
+    
+    def rollback(self) -> str:
+        """Switch back to the previous index version and return its name"""
+        if not self._rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("An index rebuild is in progress")
+        try:
+            previous = self.index_versions.previous()
+            if previous is None:
+                raise ValueError("There is no previous index version")
+            self._switch_to(self._open_version(previous), previous, activate=True)
+            return previous
+        finally:
+            self._rebuild_lock.release()
+    
+    def follow_current_version(self) -> bool:
+        """Switch to the current version if another process (worker) activated a different one"""
+        name = self.index_versions.current()
+        if str(self.index_versions.path(name)) == self.persist_directory:
+            return False
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False
+        try:
+            self._switch_to(self._open_version(name), name, activate=False)
+            return True
+        except Exception as e:
+            print(f"⚠️  Could not switch to index version {name}: {e}")
+            return False
+        finally:
+            self._rebuild_lock.release()
+    
+    def watch_index_versions(self, interval: float = None):
+        """Poll for versions activated by other processes (default: every INDEX_WATCH_SECONDS or 10; 0 disables)"""
+        if interval is None:
+            interval = float(os.getenv("INDEX_WATCH_SECONDS", "10"))
+        if interval <= 0 or self._watching:
+            return
+        self._watching = True
+        
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.follow_current_version()
+        
+        threading.Thread(target=watch, name="index-watch", daemon=True).start()
+    
+    def _version_service(self, name: str) -> "RAGService":
+        """A service over one index version, sharing this one's embedding model"""
+        path = str(self.index_versions.path(name))
+        service = RAGService(data_path=str(self.data_path), persist_directory=path,
+                             ingest_workers=self.ingest_workers, ingest_pages_per_task=self.ingest_pages_per_task,
+                             ingest_batch_size=self.ingest_batch_size, auto_initialize=False,
+                             vector_backend=self.vector_backend, embeddings=self.embeddings)
+        # The legacy version is the root itself, whose pointer would select the current version
+        service.persist_directory = path
+        # Page text is cached once for all versions
+        service.text_cache = self.text_cache
+        return service
+    
+    def _open_version(self, name: str) -> "RAGService":
+        """Open (and warm up) a complete existing index version"""
+        service = self._version_service(name)
+        if not service._has_complete_vectorstore():
+            raise ValueError(f"Index version {name} is incomplete")
+        service._initialize_vectorstore()
+        if service.vectorstore is None:
+            raise RuntimeError(service.initialization_error or f"Could not open index version {name}")
+        return service
+    
+    def _switch_to(self, source: "RAGService", name: str, activate: bool):
+        """Serve source's index once running queries have finished"""
+        with self._queries.exclusive():
+            self.vectorstore = source.vectorstore
+            self.sentence_vectors = source.sentence_vectors
+            self.lexical_index = source.lexical_index
+            self.index_version = source.index_version
+            self.persist_directory = source.persist_directory
+            # Cached answers may quote chunks of the old version
+            self.answer_cache.clear()
+            if self.phase != "ready":
+                self.phase = "ready"
+                self.initialization_complete = True
+                self.initialization_error = None
+        if activate:
+            self.index_versions.activate(name)
+        print(f"🔀 Serving index version {name} (index version {self.index_version})")
+    
+    def index_status(self) -> Dict:
+        """Index versions on disk and the state of the last rebuild, as reported by /admin/index"""
+        builder = self._rebuild_service
+        rebuild = dict(self.rebuild_state)
+        if builder is not None:
+            rebuild["progress"] = dict(builder.progress)
+        return {
+            "serving": self.persist_directory,
+            "index_version": self.index_version,
+            "current": self.index_versions.current(),
+            "previous": self.index_versions.previous(),
+            "versions": self.index_versions.describe(),
+            "rebuild": rebuild
+        }
+    
+    def get_answer(self, query: str, top_k: int = 5, return_contexts: bool = False) -> Dict[str, List[str]]:
+        """
+        Get a PRECISE answer from the top_k best matching chunks in the vector store
+        
+        The best matching chunk dominates the answer; lower-ranked chunks
+        contribute sentences only when they match the question better.
+        Contexts are returned only when return_contexts is set.
+        """
+        with self._queries.query():
+            # If vector store doesn't exist yet, return a helpful message
+            if self.vectorstore is None:
                 return {
-                    "answer": "No relevant information found in the medical literature.",
+                    "answer": self.INITIALIZING_ANSWER,
                     "contexts": []
                 }
             
-            # Get the SINGLE best matching document (lowest score = best match)
-            best_doc, best_score = docs[0]
-            
-            # Extract the most precise answer from the best document
-            page_content = best_doc.page_content
+            start_time = time.perf_counter()
+            try:
+                # Embed the query (cached, or batched with concurrent requests)
+                with stage_seconds.time("embed"):
+                    query_vector = self.embeddings.embed_query(query)
+                
+                # Paraphrases of a recent question reuse its answer
+                variant = (top_k, return_contexts)
+                with stage_seconds.time("answer_cache"):
+                    cached = self.answer_cache.get(query_vector, self.index_version, variant=variant)
+                if cached is not None:
+                    query_seconds.observe("cached", time.perf_counter() - start_time)
+                    trace = current_trace()
+                    if trace is not None:
+                        trace.cached = True
+                    return cached
+                
+                docs = self._search([query_vector], k=top_k, queries=[query])[0]
+                trace = current_trace()
+                if trace is not None:
+                    trace.chunks = chunk_scores(docs)
+                
+                result = self._answer_from_docs(query, docs, return_contexts, query_vector)
+                if docs:
+                    self.answer_cache.put(query_vector, self.index_version, result, variant=variant,
+                                          retrieval=self._retrieval_summary(docs))
+                query_seconds.observe("answered", time.perf_counter() - start_time)
+                return result
             
-            # Find the most relevant sentences within the document
-            sentences = [s.strip() for s in page_content.split(".") if s.strip()]
+            except Exception as e:
+                print(f"Error processing query: {e}")
+                query_errors.inc("get_answer")
+                query_seconds.observe("error", time.perf_counter() - start_time)
+                return {
+                    "answer": "I encountered an error processing your question. Please try rephrasing it.",
+                    "contexts": []
+                }
+    
+    def stream_answer(self, query: str, top_k: int = 5,
+                      return_contexts: bool = False) -> Iterator[Tuple[str, Dict]]:
+        """
+        get_answer as a sequence of (event, data) pairs, for streaming
+        
+        "retrieval" as soon as the search returns or the answer cache hits
+        (with the best chunk's source either way), then one "answer" per answer sentence, then "done" with the
+        same result get_answer would return. Errors are raised, not answered.
+        """
+        with self._queries.query():
+            if self.vectorstore is None:
+                yield "done", {"answer": self.INITIALIZING_ANSWER, "contexts": []}
+                return
             
-            query_lower = query.lower()
-            query_words = [w for w in query_lower.split() if len(w) > 3]
+            start_time = time.perf_counter()
+            try:
+                with stage_seconds.time("embed"):
+                    query_vector = self.embeddings.embed_query(query)
+                
+                variant = (top_k, return_contexts)
+                with stage_seconds.time("answer_cache"):
+                    hit = self.answer_cache.get_with_retrieval(query_vector, self.index_version, variant=variant)
+                if hit is not None:
+                    result, retrieval = hit
+                    yield "retrieval", {
+                        "cached": True,
+                        **retrieval,
+                        "search_ms": round((time.perf_counter() - start_time) * 1000, 2)
+                    }
+                    outcome = "cached"
+                else:
+                    docs = self._search([query_vector], k=top_k, queries=[query])[0]
+                    retrieval = self._retrieval_summary(docs)
+                    yield "retrieval", {
+                        "cached": False,
+                        **retrieval,
+                        "search_ms": round((time.perf_counter() - start_time) * 1000, 2)
+                    }
+                    result = self._answer_from_docs(query, docs, return_contexts, query_vector)
+                    if docs:
+                        self.answer_cache.put(query_vector, self.index_version, result, variant=variant,
+                                              retrieval=retrieval)
+                    outcome = "answered"
+            except Exception as e:
+                print(f"Error processing query: {e}")
+                query_errors.inc("stream_answer")
+                raise
+        
+        # Sentences of the final answer, so the streamed text always adds up to it
+        for sentence in ANSWER_SENTENCE_BREAK.split(result["answer"]):
+            if sentence:
+                yield "answer", {"text": sentence}
+        query_seconds.observe(outcome, time.perf_counter() - start_time)
+        yield "done", result
+    
+    def get_answers(self, queries: List[str], top_ks: List[int] = None,
+                    return_contexts: List[bool] = None) -> List[Dict]:
+        """
+        Answer many questions at once
+        
+        All queries are embedded in one batched call and searched in one
+        vector store query (plus one BM25 lookup each). Results come back in
+        order; an item that fails gets an "error" key instead of failing the
+        whole batch. If the shared embedding or search fails, every item not
+        answered from the cache gets that error.
+        """
+        with self._queries.query():
+            if self.vectorstore is None:
+                return [{"answer": self.INITIALIZING_ANSWER, "contexts": []} for _ in queries]
             
-            # Score each sentence for relevance
-            scored_sentences = []
-            for sentence in sentences:
-                # Skip headers, figures, short fragments
-                is_header = (
-                    sentence.isupper() or
-                    len(sentence) < 50 or
-                    sentence.startswith(('Fig', 'Box', 'Table', 'Chapter', '   ')) or
-                    sentence.count('  ') > 2
-                )
+            if top_ks is None:
+                top_ks = [5] * len(queries)
+            if return_contexts is None:
+                return_contexts = [False] * len(queries)
+            start_time = time.perf_counter()
+            results = [None] * len(queries)
+            outcomes = ["error"] * len(queries)
+            pending = []
+            searched = []
+            try:
+                with stage_seconds.time("embed"):
+                    query_vectors = self.embeddings.embed_queries(queries)
                 
-                if not is_header:
-                    sentence_lower = sentence.lower()
-                    # Count query word matches
-                    matches = sum(1 for word in query_words if word in sentence_lower)
-                    
-                    # Prioritize longer, more complete sentences
-                    score = matches * 10 + min(len(sentence), 100)
-                    
-                    scored_sentences.append((score, sentence))
+                with stage_seconds.time("answer_cache"):
+                    for i, query_vector in enumerate(query_vectors):
+                        cached = self.answer_cache.get(query_vector, self.index_version, variant=(top_ks[i], return_contexts[i]))
+                        if cached is not None:
+                            results[i] = cached
+                            outcomes[i] = "cached"
+                        else:
+                            pending.append(i)
+                
+                if pending:
+                    # One search at the largest k, trimmed per query
+                    searched = self._search([query_vectors[i] for i in pending], k=max(top_ks[i] for i in pending),
+                                            queries=[queries[i] for i in pending])
+            except Exception as e:
+                # The shared embed or search failed: every item not answered from the cache gets the error
+                print(f"Error processing query batch: {e}")
+                query_errors.inc("get_answers")
+                results = [result if result is not None else {"error": str(e)} for result in results]
+                pending = []
+            
+            for i, docs in zip(pending, searched):
+                try:
+                    docs = docs[:top_ks[i]]
+                    results[i] = self._answer_from_docs(queries[i], docs, return_contexts[i], query_vectors[i])
+                    outcomes[i] = "answered"
+                    if docs:
+                        self.answer_cache.put(query_vectors[i], self.index_version, results[i],
+                                              variant=(top_ks[i], return_contexts[i]),
+                                              retrieval=self._retrieval_summary(docs))
+                except Exception as e:
+                    print(f"Error processing query: {e}")
+                    query_errors.inc("get_answers")
+                    results[i] = {"error": str(e)}
+                    outcomes[i] = "error"
+            
+            # Every item waited for the whole batch
+            elapsed = time.perf_counter() - start_time
+            for outcome in outcomes:
+                query_seconds.observe(outcome, elapsed)
+            return results
+    
+    def _search(self, query_vectors: List[List[float]], k: int,
+                queries: List[str] = None) -> List[List[Tuple[object, float]]]:
+        """
+        Search for several queries at once, returning (chunk, score) pairs best first
+        
+        The vector search runs as one vector store call. When hybrid search is on
+        and queries are given, each query's vector and BM25 rankings are
+        merged with reciprocal rank fusion and the score is the fused score
+        (higher is better); otherwise it is the vector distance (lower is better).
+        """
+        from langchain_core.documents import Document
+        
+        hybrid = (self.hybrid_search and queries is not None
+                  and self.lexical_index is not None and not self.lexical_index.is_empty)
+        depth = max(k, self.FUSION_DEPTH) if hybrid else k
+        
+        chunks = {}
+        vector_results = []
+        with stage_seconds.time("vector_search"):
+            hits_per_query = self.vectorstore.query(query_vectors, depth)
+        for hits in hits_per_query:
+            for chunk_id, text, metadata, _ in hits:
+                chunks[chunk_id] = Document(page_content=text, metadata={**(metadata or {}), "chunk_id": chunk_id})
+            vector_results.append([(chunk_id, distance) for chunk_id, _, _, distance in hits])
+        
+        if not hybrid:
+            return [[(chunks[chunk_id], distance) for chunk_id, distance in ranked] for ranked in vector_results]
+        
+        fused = []
+        for query, ranked in zip(queries, vector_results):
+            with stage_seconds.time("lexical_search"):
+                lexical = self.lexical_index.search(query, depth)
+            fused.append(reciprocal_rank_fusion([
+                [chunk_id for chunk_id, _ in ranked],
+                [chunk_id for chunk_id, _ in lexical]
+            ])[:k])
+        
+        # Chunks only BM25 found are fetched in one call
+        missing = list({chunk_id for ranked in fused for chunk_id, _ in ranked if chunk_id not in chunks})
+        if missing:
+            with stage_seconds.time("fetch_chunks"):
+                fetched = self.vectorstore.get(missing)
+            for chunk_id, text, metadata in fetched:
+                chunks[chunk_id] = Document(page_content=text, metadata={**(metadata or {}), "chunk_id": chunk_id})
+        return [[(chunks[chunk_id], score) for chunk_id, score in ranked if chunk_id in chunks] for ranked in fused]
+    
+    @staticmethod
+    def _retrieval_summary(docs: List[Tuple[object, float]]) -> Dict:
+        """Result count and the best chunk's location, as sent in the stream's retrieval event"""
+        best = docs[0][0].metadata if docs else {}
+        return {
+            "chunks": len(docs),
+            "source": best.get("source"),
+            "page": best.get("page"),
+            "chunk_id": best.get("chunk_id")
+        }
+    
+    def _answer_from_docs(self, query: str, docs: List[Tuple[object, float]],
+                          return_contexts: bool = False, query_vector: List[float] = None) -> Dict[str, List[str]]:
+        """Build the answer from the search results of one query"""
+        if not docs:
+            return {
+                "answer": "No relevant information found in the medical literature.",
+                "contexts": []
+            }
+        
+        # Results are ordered best first
+        chunks = [doc for doc, _ in docs]
+        with stage_seconds.time("extract"):
+            result = self._extract_answer(query, chunks, query_vector)
+        if return_contexts:
+            result["contexts"] = [chunk.page_content for chunk in chunks]
+        return result
+    
+    def _extract_answer(self, query: str, chunks: List, query_vector: List[float] = None) -> Dict[str, List[str]]:
+        """
+        Extract the most precise answer for the query from the retrieved chunks
+        
+        Sentence boundaries, header flags and tokens come from each chunk's
+        precomputed sentence index, so only query tokens are matched here.
+        Where sentence vectors exist, each chunk's sentences are also ranked
+        by similarity to the query vector (one matrix-vector product per
+        chunk, no extra model calls), which catches paraphrases.
+        Candidate sentences from all chunks are scored in one vectorized pass.
+        Text repeated in overlapping chunks is only considered once, and
+        sentences from lower-ranked chunks get a small penalty so the best
+        matching chunk still dominates.
+        """
+        # Find the candidate sentences, skipping text already seen in a better chunk
+        sentences = []
+        flags = []
+        tokens = []
+        similarities = []
+        ranks = []
+        seen_sentences = set()
+        seen_text = ""
+        if query_vector is not None and self.sentence_vectors_enabled and self.sentence_vectors is not None:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+        else:
+            query_vector = None
+        for rank, chunk in enumerate(chunks):
+            text = chunk.page_content
+            index = load_sentence_index(text, chunk.metadata)
+            last_position = len(index["spans"]) - 1
+            
+            # Rows of the sentence matrix follow the chunk's non-header sentences
+            chunk_similarities = None
+            if query_vector is not None:
+                chunk_similarities = self.sentence_vectors.similarities(chunk.metadata.get("chunk_id"), query_vector)
+            row = -1
+            
+            for position, (start, end) in enumerate(index["spans"]):
+                flag = index["flags"][position]
+                if not flag & HEADER:
+                    row += 1
+                sentence = text[start:end]
+                if sentence in seen_sentences:
+                    continue
+                # Only a chunk's first and last sentences can be cut by the
+                # splitter's overlap, so only they need a substring check
+                if rank and position in (0, last_position) and sentence in seen_text:
+                    continue
+                seen_sentences.add(sentence)
+                sentences.append(sentence)
+                flags.append(flag)
+                tokens.append(index["tokens"][position])
+                has_vector = chunk_similarities is not None and not flag & HEADER and row < len(chunk_similarities)
+                similarities.append(float(chunk_similarities[row]) if has_vector else 0.0)
+                ranks.append(rank)
+            seen_text += "\n" + text
+        
+        # Skip headers, figures, short fragments
+        flags = np.array(flags, dtype=np.int64)
+        candidates = np.flatnonzero((flags & HEADER) == 0)
+        
+        # Score each sentence for relevance
+        selected_sentences = []
+        if len(candidates):
+            # Count query word matches
+            words = query_tokens(query)
+            matches = np.array([len(words.intersection(tokens[i].split())) for i in candidates])
+            lengths = np.array([len(sentences[i]) for i in candidates])
+            
+            # Semantic similarity to the question (0 where no sentence vectors exist)
+            semantic = np.asarray(similarities)[candidates] * self.SENTENCE_SIMILARITY_WEIGHT
+            
+            # Prioritize longer, more complete sentences from the best chunks
+            scores = (matches * 10 + semantic + np.minimum(lengths, 100)
+                      - np.asarray(ranks)[candidates] * self.CHUNK_RANK_PENALTY)
             
             # Sort by relevance score
-            scored_sentences.sort(reverse=True)
+            order = candidates[np.argsort(-scores, kind="stable")]
             
             # Select the top 2-3 most relevant sentences for a complete answer
-            selected_sentences = []
-            for score, sentence in scored_sentences[:3]:
-                selected_sentences.append(sentence)
+            for i in order[:3]:
+                selected_sentences.append(sentences[i])
                 # Stop when we have a good amount of content
                 if len(". ".join(selected_sentences)) > 250:
                     break
-            
-            # If we don't have enough, take sentences in order (avoiding headers)
-            if len(selected_sentences) < 2:
-                for sentence in sentences:
-                    is_header = (sentence.isupper() or len(sentence) < 50 or 
-                                sentence.startswith(('Fig', 'Box', 'Table')))
-                    if not is_header:
-                        selected_sentences.append(sentence)
-                        if len(". ".join(selected_sentences)) > 300:
-                            break
-            
-            # Build the answer
-            answer = ". ".join(selected_sentences) + "."
-            
-            # Trim to optimal length (200-400 characters)
-            if len(answer) > 500:
-                # Truncate at sentence boundary
-                truncated = answer[:500]
-                last_period = truncated.rfind(".")
-                answer = truncated[:last_period + 1] if last_period > 200 else truncated + "..."
-            elif len(answer) < 100:
-                # If too short, use the full document excerpt
-                answer = page_content[:300] + "..." if len(page_content) > 300 else page_content
-            
-            # Return empty contexts - user doesn't want to see sources
-            return {
-                "answer": answer,
-                "contexts": []  # No sources displayed
-            }
         
-        except Exception as e:
-            print(f"Error processing query: {e}")
-            return {
-                "answer": "I encountered an error processing your question. Please try rephrasing it.",
-                "contexts": []
-            }
+        # If we don't have enough, take sentences in order (avoiding headers)
+        if len(selected_sentences) < 2:
+            for sentence, flag in zip(sentences, flags):
+                if not flag & FALLBACK_HEADER and sentence not in selected_sentences:
+                    selected_sentences.append(sentence)
+                    if len(". ".join(selected_sentences)) > 300:
+                        break
+        
+        # Build the answer
+        answer = ". ".join(selected_sentences) + "."
+        
+        # Trim to optimal length (200-400 characters)
+        if len(answer) > 500:
+            # Truncate at sentence boundary
+            truncated = answer[:500]
+            last_period = truncated.rfind(".")
+            answer = truncated[:last_period + 1] if last_period > 200 else truncated + "..."
+        elif len(answer) < 100:
+            # If too short, use the best document excerpt
+            page_content = chunks[0].page_content
+            answer = page_content[:300] + "..." if len(page_content) > 300 else page_content
+        
+        # Contexts are only returned when the caller asks for them
+        return {
+            "answer": answer,
+            "contexts": []
+        }
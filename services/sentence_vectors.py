@@ -0,0 +1,117 @@
+"""
+Sentence-embedding index for extractive answer selection
+
+Every scorable (non-header) sentence of every chunk is embedded once at
+ingest time. The vectors live in one float16 matrix next to the chunk index,
+with a [start, count] row range per chunk ID, so ranking a chunk's sentences
+at query time is a single matrix-vector product against the query vector
+that was already computed for the search.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Maps chunk IDs to row ranges and names the matrix file they refer to.
+# Replacing this one file switches to a new matrix atomically.
+OFFSETS_FILE = "sentence_vectors.json"
+
+
+class SentenceVectorIndex:
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.matrix = None  # float16 (rows x dim), memory-mapped
+        self.offsets = {}   # chunk_id -> [start, count]
+        self.load()
+
+    def load(self):
+        """(Re)open the index on disk; a missing or unreadable index is empty"""
+        self.matrix = None
+        self.offsets = {}
+        try:
+            info = json.loads((self.directory / OFFSETS_FILE).read_text())
+            matrix = np.load(self.directory / info["matrix"], mmap_mode="r") if info["matrix"] else None
+        except (OSError, ValueError, KeyError):
+            return
+        self.matrix = matrix
+        self.offsets = info["chunks"]
+
+    def similarities(self, chunk_id: str, query_vector: np.ndarray) -> Optional[np.ndarray]:
+        """Cosine similarity of each of the chunk's scorable sentences to the query, or None if not indexed"""
+        entry = self.offsets.get(chunk_id)
+        if entry is None or self.matrix is None:
+            return None
+        start, count = entry
+        return self.matrix[start:start + count].astype(np.float32) @ query_vector
+
+    def update(self, keep_ids: Set[str], new_vectors: Iterable[Tuple[str, List[List[float]]]]):
+        """
+        Write a new matrix holding the rows of keep_ids plus the new chunks' rows
+
+        New rows are streamed to a scratch file first, so memory stays flat
+        however many chunks are added. The new matrix gets a new file name
+        and the offsets file is swapped last, so readers never see a half
+        written index.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        scratch_path = self.directory / "sentence_vectors.scratch"
+        new_offsets = {}
+        new_rows = 0
+        dim = self.matrix.shape[1] if self.matrix is not None else None
+        with open(scratch_path, "wb") as scratch:
+            for chunk_id, vectors in new_vectors:
+                vectors = np.asarray(vectors, dtype=np.float16)
+                if len(vectors):
+                    dim = vectors.shape[1]
+                    scratch.write(vectors.tobytes())
+                new_offsets[chunk_id] = [new_rows, len(vectors)]
+                new_rows += len(vectors)
+
+        kept = sorted((self.offsets[chunk_id] + [chunk_id] for chunk_id in keep_ids if chunk_id in self.offsets))
+        total_rows = sum(count for _, count, _ in kept) + new_rows
+        offsets = {}
+        matrix_name = None
+        if total_rows and dim:
+            generation = 1 + max(
+                [int(p.stem.rsplit("-", 1)[1]) for p in self.directory.glob("sentence_vectors-*.npy")] or [0]
+            )
+            matrix_name = f"sentence_vectors-{generation}.npy"
+            out = np.lib.format.open_memmap(
+                self.directory / matrix_name, mode="w+", dtype=np.float16, shape=(total_rows, dim)
+            )
+            row = 0
+            for start, count, chunk_id in kept:
+                out[row:row + count] = self.matrix[start:start + count]
+                offsets[chunk_id] = [row, count]
+                row += count
+            if new_rows:
+                scratch_rows = np.memmap(scratch_path, dtype=np.float16, mode="r", shape=(new_rows, dim))
+                for start in range(0, new_rows, 65536):
+                    out[row + start:row + min(start + 65536, new_rows)] = scratch_rows[start:start + 65536]
+                del scratch_rows
+            out.flush()
+            del out
+        else:
+            offsets = {chunk_id: [0, 0] for _, _, chunk_id in kept}
+        for chunk_id, (start, count) in new_offsets.items():
+            offsets[chunk_id] = [start + total_rows - new_rows, count]
+
+        tmp_path = self.directory / (OFFSETS_FILE + ".tmp")
+        tmp_path.write_text(json.dumps({"matrix": matrix_name, "chunks": offsets}))
+        os.replace(tmp_path, self.directory / OFFSETS_FILE)
+        scratch_path.unlink()
+
+        # Older matrices are no longer referenced
+        for path in self.directory.glob("sentence_vectors-*.npy"):
+            if path.name != matrix_name:
+                path.unlink()
+        self.load()
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": len(self.offsets),
+            "sentences": 0 if self.matrix is None else int(self.matrix.shape[0])
+        }
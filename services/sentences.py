@@ -0,0 +1,82 @@
+"""
+Per-chunk sentence index used for answer extraction
+
+Sentence boundaries, header/figure flags and normalized tokens depend only
+on the chunk text, so ingestion computes them once and stores them with the
+chunk (as a JSON string in its metadata, since Chroma metadata must be
+scalar). At query time only the query tokens have to be matched.
+"""
+
+import json
+import re
+from typing import Dict, List, Set
+
+# Bump when the index layout or the rules below change
+SENTENCE_INDEX_VERSION = 1
+
+METADATA_KEY = "sentence_index"
+
+# Sentence flags
+HEADER = 1           # skipped when scoring sentences
+FALLBACK_HEADER = 2  # skipped when padding a short answer with sentences in order
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words longer than 3 characters (the words that count as matches)"""
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 3]
+
+
+def query_tokens(query: str) -> Set[str]:
+    return set(tokenize(query))
+
+
+def build_sentence_index(text: str) -> Dict:
+    """
+    Split a chunk into sentences and precompute everything scoring needs
+
+    Returns spans (start/end offsets of each stripped sentence), flags
+    (HEADER / FALLBACK_HEADER bits) and tokens (space-joined unique tokens,
+    empty for headers since they're never scored).
+    """
+    spans = []
+    flags = []
+    tokens = []
+    start = 0
+    for part in text.split("."):
+        end = start + len(part)
+        stripped = part.strip()
+        if stripped:
+            offset = start + part.index(stripped)
+            spans.append([offset, offset + len(stripped)])
+
+            is_header = (
+                stripped.isupper() or
+                len(stripped) < 50 or
+                stripped.startswith(('Fig', 'Box', 'Table', 'Chapter', '   ')) or
+                stripped.count('  ') > 2
+            )
+            is_fallback_header = (
+                stripped.isupper() or
+                len(stripped) < 50 or
+                stripped.startswith(('Fig', 'Box', 'Table'))
+            )
+            flags.append((HEADER if is_header else 0) | (FALLBACK_HEADER if is_fallback_header else 0))
+            tokens.append("" if is_header else " ".join(sorted(set(tokenize(stripped)))))
+        start = end + 1
+    return {"version": SENTENCE_INDEX_VERSION, "spans": spans, "flags": flags, "tokens": tokens}
+
+
+def dumps_sentence_index(text: str) -> str:
+    return json.dumps(build_sentence_index(text), separators=(",", ":"))
+
+
+def load_sentence_index(text: str, metadata: Dict) -> Dict:
+    """The chunk's stored index, or one built on the spot for chunks indexed before it existed"""
+    stored = (metadata or {}).get(METADATA_KEY)
+    if stored:
+        index = json.loads(stored)
+        if index.get("version") == SENTENCE_INDEX_VERSION:
+            return index
+    return build_sentence_index(text)
@@ -0,0 +1,67 @@
+"""
+Startup phase timings
+
+Cold start on Render/Railway/Vercel is imports + embedding model load +
+index open. Each phase is timed where it happens and collected in
+startup_timings, which the API serves at /startup so regressions show up
+without attaching a profiler.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# When this module was first imported (app modules import it first)
+_IMPORTED_AT = time.time()
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started (Linux), or None if unknown"""
+    try:
+        with open(f"/proc/{os.getpid()}/stat") as f:
+            # Field 22 (after the parenthesized command name) is the start time in clock ticks since boot
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class StartupTimings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+        # Interpreter start up to the first import of this module
+        age = process_age()
+        self._process_started_at = _IMPORTED_AT - age if age is not None else _IMPORTED_AT
+        if age is not None:
+            self._phases["interpreter_start"] = age
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            # Repeated phases (e.g. a second index open) accumulate
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+        print(f"⏱️  {name}: {seconds:.2f}s")
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as a startup phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self) -> Dict:
+        """Phase durations and seconds since the process started"""
+        with self._lock:
+            return {
+                "phases": {name: round(seconds, 4) for name, seconds in self._phases.items()},
+                "since_process_start": round(time.time() - self._process_started_at, 4)
+            }
+
+
+startup_timings = StartupTimings()
@@ -0,0 +1,121 @@
+"""
+Per-request query tracing
+
+A Trace collects the stage durations of one query (the same stages as the
+rag_stage_duration_seconds metric) plus the chunks it retrieved. The API
+turns it into a Server-Timing header on request, and queries slower than
+SLOW_QUERY_MS can be appended to a JSON-lines slow-query log so they can be
+replayed offline against the same index (replay_slow_queries.py).
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Server-Timing groups: the vector search, BM25 lookup and chunk fetch all count as "search"
+SERVER_TIMING_GROUPS = {
+    "embed": "embed",
+    "answer_cache": "cache",
+    "vector_search": "search",
+    "lexical_search": "search",
+    "fetch_chunks": "search",
+    "extract": "extract",
+    "serialize": "serialize",
+}
+
+_local = threading.local()
+
+
+def current_trace() -> Optional["Trace"]:
+    """The trace active on this thread, if any"""
+    return getattr(_local, "trace", None)
+
+
+class Trace:
+    """Stage durations and retrieved chunks of one query; active on a thread inside `with trace:`"""
+
+    def __init__(self):
+        self.stages = {}
+        self.chunks = []  # (chunk_id, score), best first
+        self.cached = False
+
+    def __enter__(self):
+        _local.trace = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.trace = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self, total: float = None) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        groups = {}
+        for stage, seconds in self.stages.items():
+            group = SERVER_TIMING_GROUPS.get(stage, stage)
+            groups[group] = groups.get(group, 0.0) + seconds
+        if total is not None:
+            groups["total"] = total
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in groups.items())
+
+
+class SlowQueryLog:
+    """Appends queries slower than a threshold to a JSON-lines file"""
+
+    def __init__(self, path: str = None, threshold_ms: float = None):
+        """
+        Args:
+            path: Log file (default: SLOW_QUERY_LOG; unset or empty disables the log)
+            threshold_ms: Latency above which a query is logged (default: SLOW_QUERY_MS or 2000; 0 disables)
+        """
+        if path is None:
+            path = os.getenv("SLOW_QUERY_LOG", "")
+        if threshold_ms is None:
+            threshold_ms = float(os.getenv("SLOW_QUERY_MS", "2000"))
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.threshold > 0
+
+    def record(self, query: str, top_k: int, trace: Trace, seconds: float, service=None):
+        """Log the query if it took longer than the threshold; write errors are printed, not raised"""
+        if not self.enabled or seconds < self.threshold:
+            return
+        entry = {
+            "timestamp": time.time(),
+            "query": query,
+            "top_k": top_k,
+            "total_ms": round(seconds * 1000, 3),
+            "stages_ms": {stage: round(value * 1000, 3) for stage, value in trace.stages.items()},
+            "cached": trace.cached,
+            "chunks": [{"chunk_id": chunk_id, "score": score} for chunk_id, score in trace.chunks],
+        }
+        if service is not None:
+            entry.update({
+                "index_version": service.index_version,
+                "persist_directory": str(service.persist_directory),
+                "vector_backend": service.vector_backend,
+            })
+        try:
+            line = json.dumps(entry)
+            with self._lock, open(self.path, "a") as f:
+                f.write(line + "\n")
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️  Could not write slow query log {self.path}: {e}")
+
+
+def load_slow_queries(path: str) -> List[Dict]:
+    """Entries of a slow-query log, oldest first"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def chunk_scores(docs: List[Tuple[object, float]]) -> List[Tuple[str, float]]:
+    """(chunk_id, score) pairs of search results, as stored in a trace"""
+    return [(doc.metadata.get("chunk_id"), float(score)) for doc, score in docs]
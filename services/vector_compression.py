@@ -0,0 +1,143 @@
+"""
+Compressed vectors for a two-stage search
+
+The first pass ranks every chunk against a compressed copy of the vectors
+(PCA-reduced and/or int8-quantized), which is several times smaller than
+the float32 matrix. The best candidates are then rescored exactly against
+the full-precision vectors, which stay memory-mapped on disk and are only
+read for those candidates.
+
+Compression specs: "none", "int8", "pca<dims>" (e.g. "pca128") and
+"pca<dims>-int8".
+"""
+
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+_SPEC = re.compile(r"^(?:pca(\d+))?(?:-?(int8))?$")
+
+# PCA is fitted on at most this many rows
+PCA_SAMPLE_ROWS = 20000
+
+# Rows converted to float32 at a time when scoring int8 codes
+SCORE_BLOCK_ROWS = 65536
+
+
+def parse_compression(spec: str) -> Tuple[Optional[int], bool]:
+    """(PCA dimensions or None, int8 quantization) for a compression spec"""
+    spec = (spec or "none").lower()
+    if spec == "none":
+        return None, False
+    match = _SPEC.match(spec)
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unknown vector compression {spec!r} (expected none, int8, pca<dims> or pca<dims>-int8)")
+    dims, int8 = match.groups()
+    return (int(dims) if dims else None), bool(int8)
+
+
+class CompressedVectors:
+    """
+    Approximate squared L2 distances from compressed vectors
+
+    Vectors are centered and projected onto the top principal components
+    (if PCA is on), then each dimension is scaled to int8 (if quantization
+    is on). Distances are computed in that space after applying the same
+    transform to the query.
+    """
+
+    def __init__(self, spec: str, codes: np.ndarray, mean: np.ndarray = None,
+                 components: np.ndarray = None, scale: np.ndarray = None):
+        self.spec = spec
+        self.codes = codes            # (rows x dims) int8, or float32 when only PCA-reduced
+        self.mean = mean              # (dim,) or None
+        self.components = components  # (dim x dims) or None
+        self.scale = scale            # (dims,) int8 step per dimension, or None
+        decoded_norms = []
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = self._decode(codes[start:start + SCORE_BLOCK_ROWS])
+            decoded_norms.append(np.einsum("ij,ij->i", block, block))
+        self.squared_norms = np.concatenate(decoded_norms) if decoded_norms else np.zeros(0, np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, spec: str) -> "CompressedVectors":
+        dims, int8 = parse_compression(spec)
+        mean = components = scale = None
+        reduced = np.asarray(vectors, dtype=np.float32)
+        if dims:
+            sample = reduced[:PCA_SAMPLE_ROWS]
+            mean = sample.mean(axis=0)
+            # Rows of vt are the principal directions, strongest first
+            _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+            components = np.ascontiguousarray(vt[:dims].T, dtype=np.float32)
+            reduced = (reduced - mean) @ components
+        if int8:
+            scale = np.abs(reduced).max(axis=0) / 127 if len(reduced) else np.ones(reduced.shape[1], np.float32)
+            scale = np.where(scale > 0, scale, 1).astype(np.float32)
+            codes = np.clip(np.rint(reduced / scale), -127, 127).astype(np.int8)
+        else:
+            # float32 keeps the reduced product on the BLAS fast path
+            codes = np.ascontiguousarray(reduced, dtype=np.float32)
+        return cls(spec, codes, mean, components, scale)
+
+    def save(self, prefix: Path):
+        """Write <prefix>.codes.npy (memory-mappable) and <prefix>.params.npz"""
+        np.save(f"{prefix}.codes.npy", self.codes)
+        params = {name: value for name, value in
+                  (("mean", self.mean), ("components", self.components), ("scale", self.scale))
+                  if value is not None}
+        np.savez(f"{prefix}.params.npz", spec=np.array(self.spec), **params)
+
+    @classmethod
+    def load(cls, prefix: Path) -> Optional["CompressedVectors"]:
+        """Compressed vectors saved under prefix, or None if there are none"""
+        try:
+            with np.load(f"{prefix}.params.npz") as params:
+                spec = str(params["spec"])
+                extra = {name: params[name] for name in ("mean", "components", "scale") if name in params}
+            codes = np.load(f"{prefix}.codes.npy", mmap_mode="r")
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(spec, codes, **extra)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+    def transform(self, queries: np.ndarray) -> np.ndarray:
+        """Queries in the compressed space (decoded units, not codes)"""
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.components is not None:
+            queries = (queries - self.mean) @ self.components
+        return queries
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.scale is None:
+            return np.asarray(codes, dtype=np.float32)
+        return codes.astype(np.float32) * self.scale
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate squared L2 distance of every row to each query (queries x rows)"""
+        reduced = self.transform(queries)
+        # Fold the int8 step into the query so codes are only cast, not rescaled
+        scaled = reduced * self.scale if self.scale is not None else reduced
+        if self.scale is None:
+            products = scaled @ self.codes.T
+        else:
+            # NumPy has no int8 matrix product, so int8 codes are widened block by block
+            products = np.empty((len(reduced), len(self.codes)), dtype=np.float32)
+            for start in range(0, len(self.codes), SCORE_BLOCK_ROWS):
+                block = self.codes[start:start + SCORE_BLOCK_ROWS]
+                products[:, start:start + len(block)] = scaled @ block.T.astype(np.float32)
+        return self.squared_norms - 2 * products + np.einsum("ij,ij->i", reduced, reduced)[:, None]
+
+
+def rescore(vectors: np.ndarray, squared_norms: np.ndarray, query: np.ndarray,
+            candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top k of the candidate rows for one query: (rows, squared L2 distances), nearest first"""
+    candidates = np.sort(candidates)  # sorted reads from the memory-mapped matrix
+    exact = squared_norms[candidates] - 2 * (vectors[candidates] @ query) + query @ query
+    order = np.argsort(exact, kind="stable")[:k]
+    return candidates[order], exact[order]
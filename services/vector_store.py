@@ -0,0 +1,384 @@
+"""
+Vector store backends
+
+RAGService talks to the vector store through the small interface below, so
+the storage can be chosen with VECTOR_BACKEND:
+
+- "chroma" (default): the persistent Chroma collection used so far.
+- "numpy": exact brute-force search over a memory-mapped float32 matrix.
+  For a corpus of this size one matrix product is faster and more
+  predictable than an HNSW index, and it needs no SQLite. Distances are
+  squared L2 like Chroma's default, so both backends rank chunks the same.
+  With VECTOR_COMPRESSION set, the first pass runs over compressed vectors
+  and only the best VECTOR_RESCORE candidates are scored exactly.
+
+Every method takes and returns plain (chunk_id, text, metadata[, distance])
+tuples, never LangChain objects.
+"""
+
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from services.vector_compression import CompressedVectors, parse_compression, rescore
+
+DEFAULT_BACKEND = "chroma"
+
+# Lists the numpy backend's segments and the chunk IDs stored in each.
+# Replacing this one file switches to a new state atomically.
+STATE_FILE = "vector_store.json"
+
+# Rows copied per block when compacting, so memory stays flat however large the index is
+COMPACT_BLOCK_ROWS = 65536
+
+
+def get_vector_backend(backend: str = None) -> str:
+    """Backend name (default: VECTOR_BACKEND or "chroma")"""
+    if backend is None:
+        backend = os.getenv("VECTOR_BACKEND", DEFAULT_BACKEND)
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector backend {backend!r} (expected one of: {', '.join(BACKENDS)})")
+    return backend
+
+
+def create_vector_store(persist_directory: str, embeddings: Embeddings, backend: str = None):
+    """Open (or create) the vector store in persist_directory"""
+    return BACKENDS[get_vector_backend(backend)](persist_directory, embeddings)
+
+
+class ChromaVectorStore:
+    """The persistent Chroma collection"""
+
+    def __init__(self, persist_directory: str, embeddings: Embeddings):
+        from langchain_community.vectorstores import Chroma
+
+        self.store = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+        self._collection = self.store._collection
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def ids(self) -> List[str]:
+        return self._collection.get(include=[])["ids"]
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        # Chroma upserts by ID, so replaying a half-written batch can't duplicate it
+        self.store.add_texts(texts, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: List[str]):
+        self.store.delete(ids=ids)
+
+    def get(self, ids: List[str]) -> List[Tuple[str, str, Dict]]:
+        got = self._collection.get(ids=ids, include=["documents", "metadatas"])
+        return list(zip(got["ids"], got["documents"], got["metadatas"]))
+
+    def query(self, query_vectors: List[List[float]], k: int) -> List[List[Tuple[str, str, Dict, float]]]:
+        """Top k (chunk_id, text, metadata, distance) per query vector, nearest first"""
+        results = self._collection.query(
+            query_embeddings=query_vectors,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            list(zip(ids, texts, metadatas, distances))
+            for ids, texts, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def compact(self):
+        """Nothing to do: Chroma maintains its own index"""
+
+
+class _Segment:
+    """One memory-mapped block of vectors with its chunk texts and metadata"""
+
+    def __init__(self, directory: Path, name: str, ids: List[str], dead: Sequence[int] = ()):
+        self.name = name
+        self.ids = ids
+        self.dead = set(dead)  # rows of deleted chunks, dropped at compaction
+        self.vectors = np.load(directory / f"{name}.vectors.npy", mmap_mode="r")
+        self.offsets = np.load(directory / f"{name}.offsets.npy", mmap_mode="r")
+        # Saved with the segment, so opening it doesn't read every full-precision row
+        norms_path = directory / f"{name}.norms.npy"
+        if norms_path.exists():
+            self.squared_norms = np.load(norms_path, mmap_mode="r")
+        else:
+            # Segments written before the norms were saved
+            self.squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        with open(directory / f"{name}.docs", "rb") as f:
+            # mmap can't map an empty file
+            self.docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self.live = np.ones(len(ids), dtype=bool)
+        self.compressed = None  # CompressedVectors for the first search pass, if enabled
+
+    def record(self, row: int) -> Tuple[str, Dict]:
+        """(text, metadata) of a row"""
+        return tuple(json.loads(self.docs[self.offsets[row]:self.offsets[row + 1]]))
+
+
+class NumpyVectorStore:
+    """
+    Exact search over memory-mapped .npy segments
+
+    Each add() writes a segment: a float32 vector matrix with its squared
+    row norms, the chunks' text and metadata as concatenated JSON records in
+    a .docs file, and the record offsets. Re-adding a chunk leaves its old row dead, and deleting one
+    records its row as a tombstone in vector_store.json; neither rewrites a
+    segment file. compact() rewrites everything live into a single segment,
+    so after a build a query is one matrix product and an argpartition.
+    
+    With compression on, compact() also saves a compressed copy of that
+    segment, and queries rank it first and rescore only the top candidates
+    against the full-precision rows.
+    """
+
+    def __init__(self, persist_directory: str, embeddings: Embeddings,
+                 compression: str = None, rescore_candidates: int = None):
+        """
+        Args:
+            persist_directory: Directory holding the segments
+            embeddings: Model used to embed added chunks
+            compression: First-pass compression, e.g. "int8" or "pca128-int8" (default: VECTOR_COMPRESSION or "none")
+            rescore_candidates: Candidates rescored exactly per query, at least k (default: VECTOR_RESCORE or 100)
+        """
+        if compression is None:
+            compression = os.getenv("VECTOR_COMPRESSION", "none")
+        if rescore_candidates is None:
+            rescore_candidates = int(os.getenv("VECTOR_RESCORE", "100"))
+        parse_compression(compression)  # fail early on a bad spec
+        self.directory = Path(persist_directory)
+        self.embeddings = embeddings
+        self.compression = compression.lower()
+        self.rescore_candidates = max(1, rescore_candidates)
+        self._lock = threading.Lock()
+        self._segments = ()
+        self._locations = {}  # chunk_id -> (segment, row) of its live copy
+        self._next_segment = 1
+        self._load()
+
+    def _load(self):
+        try:
+            state = json.loads((self.directory / STATE_FILE).read_text())
+        except (OSError, ValueError):
+            state = {"segments": [], "next_segment": 1}
+        self._next_segment = state["next_segment"]
+        segments = [_Segment(self.directory, s["name"], s["ids"], s.get("dead", ())) for s in state["segments"]]
+        if len(segments) == 1:
+            self._attach_compressed(segments[0], save=False)
+        self._set_segments(segments)
+
+    def _compressed_prefix(self, segment: _Segment) -> Path:
+        return self.directory / f"{segment.name}.{self.compression}"
+
+    def _attach_compressed(self, segment: _Segment, save: bool):
+        """Load (or fit, and save if asked) the compressed copy of a compacted segment"""
+        if self.compression == "none" or not len(segment.ids):
+            return
+        prefix = self._compressed_prefix(segment)
+        saved = CompressedVectors.load(prefix)
+        compressed = saved or segment.compressed
+        if compressed is None:
+            if not save:
+                print(f"ℹ️  No {self.compression} vectors saved for {segment.name}; compressing in memory "
+                      f"(a rebuild saves them)")
+            compressed = CompressedVectors.fit(segment.vectors, self.compression)
+        if save and saved is None:
+            compressed.save(prefix)
+        segment.compressed = compressed
+
+    def _set_segments(self, segments: List[_Segment]):
+        # Later segments win, so an upserted chunk lives in the last segment that has it
+        locations = {}
+        live = [np.zeros(len(segment.ids), dtype=bool) for segment in segments]
+        for number, segment in enumerate(segments):
+            for row, chunk_id in enumerate(segment.ids):
+                previous = locations.pop(chunk_id, None)
+                if previous is not None:
+                    live[previous[0]][previous[1]] = False
+                if row not in segment.dead:
+                    locations[chunk_id] = (number, row)
+                    live[number][row] = True
+        for segment, segment_live in zip(segments, live):
+            segment.live = segment_live
+        self._locations = locations
+        self._segments = tuple(segments)
+
+    def _save_state(self, segments: Sequence[_Segment]):
+        tmp_path = self.directory / (STATE_FILE + ".tmp")
+        tmp_path.write_text(json.dumps({
+            "next_segment": self._next_segment,
+            "segments": [{"name": segment.name, "ids": segment.ids, "dead": sorted(segment.dead)}
+                         for segment in segments]
+        }))
+        os.replace(tmp_path, self.directory / STATE_FILE)
+
+    def _write_segment(self, ids: List[str], vectors: np.ndarray, records: List[bytes]) -> _Segment:
+        name = f"segment-{self._next_segment}"
+        self._next_segment += 1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        np.save(self.directory / f"{name}.vectors.npy", vectors)
+        np.save(self.directory / f"{name}.norms.npy", np.einsum("ij,ij->i", vectors, vectors))
+        np.save(self.directory / f"{name}.offsets.npy",
+                np.concatenate(([0], np.cumsum([len(record) for record in records], dtype=np.int64))))
+        with open(self.directory / f"{name}.docs", "wb") as f:
+            for record in records:
+                f.write(record)
+        return _Segment(self.directory, name, list(ids))
+
+    def _write_compacted(self, segments: Sequence[_Segment], rows: int) -> _Segment:
+        """One segment with the live rows of segments, copied block by block into a memory-mapped file"""
+        name = f"segment-{self._next_segment}"
+        self._next_segment += 1
+        dim = segments[0].vectors.shape[1]
+        vectors = np.lib.format.open_memmap(self.directory / f"{name}.vectors.npy", mode="w+",
+                                            dtype=np.float32, shape=(rows, dim))
+        squared_norms = np.lib.format.open_memmap(self.directory / f"{name}.norms.npy", mode="w+",
+                                                  dtype=np.float32, shape=(rows,))
+        offsets = np.zeros(rows + 1, dtype=np.int64)
+        ids = []
+        with open(self.directory / f"{name}.docs", "wb") as f:
+            for segment in segments:
+                live_rows = np.flatnonzero(segment.live)
+                for start in range(0, len(live_rows), COMPACT_BLOCK_ROWS):
+                    block = live_rows[start:start + COMPACT_BLOCK_ROWS]
+                    position = len(ids)
+                    block_vectors = segment.vectors[block]
+                    vectors[position:position + len(block)] = block_vectors
+                    squared_norms[position:position + len(block)] = np.einsum("ij,ij->i", block_vectors, block_vectors)
+                    for row in block:
+                        record = segment.docs[segment.offsets[row]:segment.offsets[row + 1]]
+                        f.write(record)
+                        offsets[len(ids) + 1] = offsets[len(ids)] + len(record)
+                        ids.append(segment.ids[row])
+        vectors.flush()
+        squared_norms.flush()
+        del vectors, squared_norms
+        np.save(self.directory / f"{name}.offsets.npy", offsets)
+        return _Segment(self.directory, name, ids)
+
+    def count(self) -> int:
+        return len(self._locations)
+
+    def ids(self) -> List[str]:
+        return list(self._locations)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        vectors = self.embeddings.embed_documents(texts)
+        records = [
+            json.dumps([text, metadata or {}], separators=(",", ":")).encode("utf-8")
+            for text, metadata in zip(texts, metadatas)
+        ]
+        with self._lock:
+            segment = self._write_segment(ids, vectors, records)
+            segments = list(self._segments) + [segment]
+            self._save_state(segments)
+            self._set_segments(segments)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            segments = self._segments
+            for chunk_id in ids:
+                location = self._locations.get(chunk_id)
+                if location is not None:
+                    # Only the state file changes; the row is dropped at compaction
+                    segments[location[0]].dead.add(location[1])
+            self._save_state(segments)
+            self._set_segments(list(segments))
+
+    def get(self, ids: List[str]) -> List[Tuple[str, str, Dict]]:
+        segments = self._segments
+        locations = self._locations
+        found = []
+        for chunk_id in ids:
+            location = locations.get(chunk_id)
+            if location is not None:
+                text, metadata = segments[location[0]].record(location[1])
+                found.append((chunk_id, text, metadata))
+        return found
+
+    def query(self, query_vectors: List[List[float]], k: int) -> List[List[Tuple[str, str, Dict, float]]]:
+        """Top k (chunk_id, text, metadata, squared L2 distance) per query vector, nearest first"""
+        segments = [segment for segment in self._segments if len(segment.ids)]
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if not segments:
+            return [[] for _ in query_vectors]
+        if len(segments) == 1 and segments[0].compressed is not None:
+            return self._two_stage_query(segments[0], queries, k)
+
+        # ||q - x||^2 = ||x||^2 - 2 q.x + ||q||^2, one matrix product per segment
+        distances = np.hstack([
+            np.where(segment.live, segment.squared_norms - 2 * (queries @ segment.vectors.T), np.inf)
+            for segment in segments
+        ]) + np.einsum("ij,ij->i", queries, queries)[:, None]
+        ends = np.cumsum([len(segment.ids) for segment in segments])
+        k = min(k, int(sum(segment.live.sum() for segment in segments)))
+
+        results = []
+        for query_distances in distances:
+            results.append(self._hits(segments, ends, np.arange(len(query_distances)), query_distances, k))
+        return results
+
+    def _hits(self, segments: List[_Segment], ends: np.ndarray, rows: np.ndarray,
+              distances: np.ndarray, k: int) -> List[Tuple[str, str, Dict, float]]:
+        """The k nearest of the given global rows as (chunk_id, text, metadata, distance)"""
+        top = np.argpartition(distances, k - 1)[:k] if 0 < k < len(distances) else np.arange(min(k, len(distances)))
+        top = top[np.argsort(distances[top], kind="stable")]
+        hits = []
+        for i in top:
+            number = int(np.searchsorted(ends, rows[i], side="right"))
+            segment = segments[number]
+            row = int(rows[i] - (ends[number] - len(segment.ids)))
+            text, metadata = segment.record(row)
+            hits.append((segment.ids[row], text, metadata, float(max(distances[i], 0.0))))
+        return hits
+
+
+    def _two_stage_query(self, segment: _Segment, queries: np.ndarray,
+                         k: int) -> List[List[Tuple[str, str, Dict, float]]]:
+        """Rank by compressed distance, then rescore the best candidates exactly"""
+        approximate = segment.compressed.distances(queries)
+        approximate[:, ~segment.live] = np.inf
+        live = int(segment.live.sum())
+        candidates_per_query = min(max(k, self.rescore_candidates), live)
+        ends = np.array([len(segment.ids)])
+        results = []
+        for query, query_distances in zip(queries, approximate):
+            if 0 < candidates_per_query < len(query_distances):
+                candidates = np.argpartition(query_distances, candidates_per_query - 1)[:candidates_per_query]
+            else:
+                candidates = np.flatnonzero(np.isfinite(query_distances))
+            rows, exact = rescore(segment.vectors, segment.squared_norms, query, candidates, k)
+            results.append(self._hits([segment], ends, rows, exact, k))
+        return results
+
+    def compact(self):
+        """Rewrite all live rows into a single segment and remove unreferenced files"""
+        with self._lock:
+            segments = self._segments
+            if not (len(segments) == 1 and segments[0].live.all()):
+                live = sum(int(segment.live.sum()) for segment in segments)
+                segments = [self._write_compacted(segments, live)] if live else []
+                self._save_state(segments)
+                self._set_segments(segments)
+            for segment in segments:
+                self._attach_compressed(segment, save=True)
+
+            referenced = {segment.name for segment in segments}
+            for path in self.directory.glob("segment-*"):
+                if path.name.split(".")[0] not in referenced:
+                    path.unlink()
+
+
+BACKENDS = {
+    "chroma": ChromaVectorStore,
+    "numpy": NumpyVectorStore,
+}
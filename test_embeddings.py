@@ -0,0 +1,193 @@
+"""
+Agreement check for the embedding backends
+Run this before switching EMBEDDING_BACKEND: the chosen backend must embed
+text (nearly) the same way as the reference sentence-transformers model,
+otherwise queries stop matching the vectors already in the index.
+
+    EMBEDDING_BACKEND=onnx python test_embeddings.py
+    EMBEDDING_BACKEND=onnx python -m pytest test_embeddings.py
+
+Under pytest the checks are skipped when either backend can't be loaded
+here (e.g. onnxruntime isn't installed), and fail on a real disagreement.
+"""
+
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from services.embeddings import create_model_embeddings, get_embedding_backend
+
+# Configuration
+BACKEND = get_embedding_backend(os.getenv("EMBEDDING_BACKEND", "onnx"))
+REFERENCE_BACKEND = "huggingface"
+MIN_COSINE = float(os.getenv("EMBEDDING_AGREEMENT_MIN", "0.99"))
+
+QUESTIONS = [
+    "What are common symptoms of diabetes?",
+    "How is hypertension treated?",
+    "What causes myocardial infarction?",
+    "Side effects of metformin",
+    "What is COPD?",
+    "How does insulin regulate blood glucose?",
+    "Signs of vitamin B12 deficiency",
+    "What is the first-line antibiotic for community-acquired pneumonia?",
+]
+
+PASSAGES = [
+    "Diabetes mellitus presents with polyuria, polydipsia, weight loss and fatigue. Chronic hyperglycaemia damages small vessels.",
+    "First-line treatment of essential hypertension includes thiazide diuretics, ACE inhibitors and calcium channel blockers.",
+    "Myocardial infarction is usually caused by rupture of an atherosclerotic plaque and thrombotic occlusion of a coronary artery.",
+    "Metformin commonly causes gastrointestinal upset, diarrhoea and, rarely, lactic acidosis.",
+    "Chronic obstructive pulmonary disease (COPD) is a progressive airflow limitation, most often caused by smoking.",
+    "Insulin promotes glucose uptake into muscle and fat and suppresses hepatic gluconeogenesis.",
+    "Vitamin B12 deficiency causes megaloblastic anaemia, glossitis and peripheral neuropathy.",
+    "Amoxicillin is the usual first-line antibiotic for community-acquired pneumonia in adults without comorbidities.",
+    "Fig. 12.3 Chest radiograph showing lobar consolidation.",
+]
+
+
+@lru_cache(maxsize=None)
+def load_backend(backend):
+    """Model for a backend, with its load time and the resident memory it added"""
+    rss_before = resident_mb()
+    start_time = time.time()
+    model = create_model_embeddings(backend)
+    model.embed_query("warm up")
+    return model, time.time() - start_time, resident_mb() - rss_before
+
+
+def resident_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def embed(backend, texts):
+    vectors = np.asarray(load_backend(backend)[0].embed_documents(texts), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def check_cosine_agreement():
+    """Every text must embed to (nearly) the same direction as with the reference model"""
+    print(f"Testing cosine agreement of {BACKEND} with {REFERENCE_BACKEND}...")
+    texts = QUESTIONS + PASSAGES
+    cosines = np.einsum("ij,ij->i", embed(BACKEND, texts), embed(REFERENCE_BACKEND, texts))
+    worst = int(np.argmin(cosines))
+    print(f"  min {cosines.min():.5f}, mean {cosines.mean():.5f} (worst: {texts[worst][:60]!r})")
+    assert cosines.min() >= MIN_COSINE, f"Cosine {cosines.min():.5f} below {MIN_COSINE}"
+    print(f"✓ All {len(texts)} texts agree (cosine >= {MIN_COSINE})")
+
+
+def check_retrieval_agreement():
+    """Each question must retrieve the same best passage with both models"""
+    print("\nTesting retrieval agreement...")
+    candidate = embed(BACKEND, QUESTIONS) @ embed(BACKEND, PASSAGES).T
+    reference = embed(REFERENCE_BACKEND, QUESTIONS) @ embed(REFERENCE_BACKEND, PASSAGES).T
+    agree = candidate.argmax(axis=1) == reference.argmax(axis=1)
+    for question, same in zip(QUESTIONS, agree):
+        if not same:
+            print(f"  different best passage for: {question}")
+    assert agree.all(), f"{int((~agree).sum())} of {len(QUESTIONS)} questions retrieve a different passage"
+    print(f"✓ Same best passage for all {len(QUESTIONS)} questions")
+
+
+def check_query_latency():
+    """Report single-query encode latency and resident memory of both backends"""
+    print("\nMeasuring query latency and memory...")
+    for backend in (BACKEND, REFERENCE_BACKEND):
+        model, load_seconds, added_mb = load_backend(backend)
+        timings = []
+        for question in QUESTIONS * 5:
+            start_time = time.perf_counter()
+            model.embed_query(question)
+            timings.append(time.perf_counter() - start_time)
+        print(f"  {backend:<12} {np.median(timings) * 1000:7.2f} ms/query (median), "
+              f"loaded in {load_seconds:.1f}s, +{added_mb:.0f} MB resident")
+    print("✓ Latency measured")
+
+
+def require_backends():
+    """Skip the calling pytest test when there is nothing to compare or a backend can't be loaded"""
+    import pytest
+
+    if BACKEND == REFERENCE_BACKEND:
+        pytest.skip("Set EMBEDDING_BACKEND to onnx, onnx-int8 or torch-int8")
+    for backend in (BACKEND, REFERENCE_BACKEND):
+        try:
+            load_backend(backend)
+        except Exception as e:
+            pytest.skip(f"{backend} backend unavailable: {e}")
+
+
+def test_cosine_agreement():
+    require_backends()
+    check_cosine_agreement()
+
+
+def test_retrieval_agreement():
+    require_backends()
+    check_retrieval_agreement()
+
+
+def test_query_latency():
+    require_backends()
+    check_query_latency()
+
+
+def main():
+    print("=" * 60)
+    print("Embedding Backend Agreement Test")
+    print("=" * 60)
+    print(f"Backend under test: {BACKEND} (reference: {REFERENCE_BACKEND})")
+    print()
+
+    if BACKEND == REFERENCE_BACKEND:
+        print("Nothing to compare: set EMBEDDING_BACKEND to onnx, onnx-int8 or torch-int8")
+        return 1
+
+    tests = [
+        ("Cosine Agreement", check_cosine_agreement),
+        ("Retrieval Agreement", check_retrieval_agreement),
+        ("Query Latency", check_query_latency),
+    ]
+
+    results = []
+    for test_name, check in tests:
+        try:
+            check()
+            result = True
+        except Exception as e:
+            print(f"✗ {e}")
+            result = False
+        results.append((test_name, result))
+
+    # Summary
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status} - {test_name}")
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    print(f"\nPassed: {passed}/{total}")
+
+    if passed == total:
+        print(f"\n🎉 {BACKEND} can replace {REFERENCE_BACKEND}")
+        return 0
+    else:
+        print("\n⚠️  Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
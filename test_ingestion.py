@@ -0,0 +1,216 @@
+"""
+Ingestion regression tests, run with pytest
+
+Builds a small synthetic corpus with the benchmark's stub embedder, so no
+model download is needed:
+
+    python -m pytest test_ingestion.py
+"""
+
+import numpy as np
+import pytest
+
+from benchmark import StubEmbeddings, generate_corpus
+
+
+@pytest.fixture
+def build_service(tmp_path, monkeypatch):
+    from services import embeddings
+
+    monkeypatch.setitem(embeddings.BACKENDS, "stub", StubEmbeddings)
+    monkeypatch.setenv("EMBEDDING_BACKEND", "stub")
+    monkeypatch.setenv("WARM_UP", "0")
+    monkeypatch.setenv("INGEST_WORKERS", "1")
+    from services.rag_service import RAGService
+
+    def build():
+        service = RAGService(data_path=str(tmp_path / "corpus"), persist_directory=str(tmp_path / "index"),
+                             auto_initialize=False, vector_backend="numpy")
+        service.rebuild_vectorstore()
+        return service
+
+    return build
+
+
+def test_changed_pdf_gets_fresh_sentence_vectors(tmp_path, build_service):
+    from services.sentences import HEADER, load_sentence_index
+
+    corpus = tmp_path / "corpus"
+    generate_corpus(corpus, pdfs=2, pages=3, seed=1)
+    build_service()
+
+    # Same file name and page count, different text: the chunk IDs are reused
+    changed = tmp_path / "changed"
+    generate_corpus(changed, pdfs=1, pages=3, seed=2)
+    (changed / "synthetic_000.pdf").replace(corpus / "synthetic_000.pdf")
+    service = build_service()
+
+    model = StubEmbeddings()
+    ids = sorted(service.vectorstore.ids())
+    assert any(chunk_id.startswith("synthetic_000.pdf:") for chunk_id in ids)
+    for chunk_id, text, metadata in service.vectorstore.get(ids):
+        index = load_sentence_index(text, metadata)
+        sentences = [text[start:end] for (start, end), flag in zip(index["spans"], index["flags"])
+                     if not flag & HEADER]
+        start, count = service.sentence_vectors.offsets[chunk_id]
+        assert count == len(sentences), chunk_id
+        if not sentences:
+            continue
+        stored = service.sentence_vectors.matrix[start:start + count].astype(np.float32)
+        expected = np.asarray(model.embed_documents(sentences), dtype=np.float32)
+        cosines = np.einsum("ij,ij->i", stored, expected) / (
+            np.linalg.norm(stored, axis=1) * np.linalg.norm(expected, axis=1) + 1e-9)
+        assert cosines.min() > 0.99, chunk_id
+
+
+def test_sentence_vectors_off_are_not_loaded(tmp_path, build_service, monkeypatch):
+    generate_corpus(tmp_path / "corpus", pdfs=1, pages=2, seed=1)
+    build_service()
+
+    monkeypatch.setenv("SENTENCE_VECTORS", "0")
+    from services.rag_service import RAGService
+
+    service = RAGService(data_path=str(tmp_path / "corpus"), persist_directory=str(tmp_path / "index"),
+                         vector_backend="numpy")
+    assert service.vectorstore is not None
+    assert service.sentence_vectors is None
+    assert service.get_answer("What are the symptoms of diabetes?", top_k=3)["answer"]
+    assert build_service().sentence_vectors is None
+
+
+def test_numpy_store_delete_writes_tombstones(tmp_path, monkeypatch):
+    from services import vector_store
+    from services.vector_store import NumpyVectorStore
+
+    # Compaction copies several blocks
+    monkeypatch.setattr(vector_store, "COMPACT_BLOCK_ROWS", 3)
+    store = NumpyVectorStore(str(tmp_path), StubEmbeddings(), compression="none")
+    texts = {f"doc:{i}": f"chunk {i} about diabetes insulin glucose {i % 3}" for i in range(10)}
+    ids = list(texts)
+    store.add(ids[:5], [texts[i] for i in ids[:5]], [{"n": i} for i in range(5)])
+    store.add(ids[5:], [texts[i] for i in ids[5:]], [{"n": i} for i in range(5, 10)])
+    store.compact()
+    store.add(ids[8:], [texts[i] + " again" for i in ids[8:]], [{}, {}])
+    segment_files = sorted(path.name for path in tmp_path.glob("segment-*"))
+
+    store.delete(["doc:1", "doc:6", "doc:9", "missing"])
+    assert sorted(path.name for path in tmp_path.glob("segment-*")) == segment_files
+    expected = sorted(set(ids) - {"doc:1", "doc:6", "doc:9"})
+    assert sorted(store.ids()) == expected
+    assert sorted(NumpyVectorStore(str(tmp_path), StubEmbeddings(), compression="none").ids()) == expected
+
+    store.compact()
+    reopened = NumpyVectorStore(str(tmp_path), StubEmbeddings(), compression="none")
+    assert sorted(reopened.ids()) == expected
+    assert len(list(tmp_path.glob("segment-*.vectors.npy"))) == 1
+    got = {chunk_id: text for chunk_id, text, _ in reopened.get(expected)}
+    assert got["doc:8"] == texts["doc:8"] + " again"
+    assert got["doc:2"] == texts["doc:2"]
+    for chunk_id in expected:
+        hit = reopened.query([StubEmbeddings().embed_query(got[chunk_id])], k=1)[0][0]
+        assert hit[3] < 1e-5
+
+
+def test_failed_page_range_is_parsed_again(tmp_path, build_service, monkeypatch):
+    from services import ingestion
+
+    monkeypatch.setenv("INGEST_PAGES_PER_TASK", "2")
+    generate_corpus(tmp_path / "corpus", pdfs=2, pages=4, seed=1)
+    parse_page_range = ingestion.parse_page_range
+
+    def flaky_parse(task):
+        if task[0].endswith("synthetic_000.pdf") and task[1] == 2:
+            raise ValueError("damaged page")
+        return parse_page_range(task)
+
+    monkeypatch.setattr(ingestion, "parse_page_range", flaky_parse)
+    first = sorted(build_service().vectorstore.ids())
+    monkeypatch.setattr(ingestion, "parse_page_range", parse_page_range)
+    second = sorted(build_service().vectorstore.ids())
+
+    retried = [chunk_id for chunk_id in second if chunk_id not in first]
+    assert retried and all(chunk_id.startswith("synthetic_000.pdf:") for chunk_id in retried)
+    assert set(first) < set(second)
+    # Nothing left to retry
+    assert sorted(build_service().vectorstore.ids()) == second
+
+
+def test_numpy_store_opens_saved_norms(tmp_path):
+    from services.vector_store import NumpyVectorStore
+
+    store = NumpyVectorStore(str(tmp_path), StubEmbeddings(), compression="none")
+    store.add(["a:0", "a:1"], ["insulin and glucose", "asthma inhaler"], [{}, {}])
+    store.add(["b:0"], ["blood pressure"], [{}])
+    for compacted in (False, True):
+        if compacted:
+            store.compact()
+        reopened = NumpyVectorStore(str(tmp_path), StubEmbeddings(), compression="int8")
+        for segment in reopened._segments:
+            assert isinstance(segment.squared_norms, np.memmap)
+            expected = np.einsum("ij,ij->i", segment.vectors, segment.vectors)
+            np.testing.assert_allclose(segment.squared_norms, expected, rtol=1e-6)
+        assert reopened.query([StubEmbeddings().embed_query("blood pressure")], k=1)[0][0][0] == "b:0"
+
+
+def test_batch_failure_is_reported_per_item(tmp_path, build_service, monkeypatch):
+    from services import metrics
+
+    generate_corpus(tmp_path / "corpus", pdfs=1, pages=2, seed=1)
+    service = build_service()
+    cached = service.get_answers(["What are the symptoms of diabetes?"])[0]
+
+    def observed(outcome):
+        series = metrics.query_seconds._series.get(outcome)
+        return sum(series[0]) if series else 0
+
+    before = {outcome: observed(outcome) for outcome in ("cached", "error")}
+
+    def broken_search(*args, **kwargs):
+        raise RuntimeError("search failed")
+
+    monkeypatch.setattr(service, "_search", broken_search)
+    results = service.get_answers(["What are the symptoms of diabetes?", "How is asthma treated?"])
+    assert results[0] == cached
+    assert results[1] == {"error": "search failed"}
+    assert observed("cached") == before["cached"] + 1
+    assert observed("error") == before["error"] + 1
+
+
+def test_interrupted_build_resumes_from_journal(tmp_path, build_service, monkeypatch):
+    from services.ingestion import MANIFEST_JOURNAL_FILE, load_manifest
+    from services.vector_store import NumpyVectorStore
+
+    monkeypatch.setenv("INGEST_BATCH_SIZE", "4")
+    monkeypatch.setenv("PDF_TEXT_CACHE", "0")
+    generate_corpus(tmp_path / "corpus", pdfs=2, pages=4, seed=1)
+    add = NumpyVectorStore.add
+    calls = []
+
+    def crashing_add(self, ids, texts, metadatas):
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        calls.append(ids)
+        add(self, ids, texts, metadatas)
+
+    monkeypatch.setattr(NumpyVectorStore, "add", crashing_add)
+    with pytest.raises(KeyboardInterrupt):
+        build_service()
+    index = tmp_path / "index"
+    assert (index / MANIFEST_JOURNAL_FILE).exists()
+    manifest = load_manifest(str(index))
+    committed = [chunk_id for entry in manifest["files"].values() for chunk_id in entry["chunk_ids"]]
+    assert committed == [chunk_id for ids in calls for chunk_id in ids]
+    assert not manifest["complete"]
+
+    monkeypatch.setattr(NumpyVectorStore, "add", add)
+    resumed = build_service()
+    assert not (index / MANIFEST_JOURNAL_FILE).exists()
+    assert load_manifest(str(index))["complete"]
+
+    generate_corpus(tmp_path / "clean" / "corpus", pdfs=2, pages=4, seed=1)
+    from services.rag_service import RAGService
+
+    clean = RAGService(data_path=str(tmp_path / "clean" / "corpus"), persist_directory=str(tmp_path / "clean" / "index"),
+                       auto_initialize=False, vector_backend="numpy")
+    clean.rebuild_vectorstore()
+    assert sorted(resumed.vectorstore.ids()) == sorted(clean.vectorstore.ids())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Recall@k vs latency report for the compressed first-pass search
+
+For each compression level (VECTOR_COMPRESSION) and rescoring depth
+(VECTOR_RESCORE), measures how many of the exact top-k chunks the two-stage
+search still finds, how long a single query takes and how big the
+compressed index is. Run it against the built index, or against synthetic
+vectors to see what a larger corpus would cost:
+
+    python vector_compression_report.py
+    python vector_compression_report.py --synthetic 200000 --json report.json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from services.index_versions import IndexVersions
+from services.vector_compression import CompressedVectors, rescore
+
+DEFAULT_COMPRESSIONS = ["int8", "pca192", "pca128", "pca64", "pca128-int8", "pca64-int8"]
+DEFAULT_RESCORE = [0, 50, 100, 200]
+
+
+def load_index_vectors(persist_directory: str) -> np.ndarray:
+    """Full-precision vectors of the built index (numpy backend, else Chroma)"""
+    from services.vector_store import NumpyVectorStore
+
+    store = NumpyVectorStore(persist_directory, embeddings=None, compression="none")
+    segments = [segment for segment in store._segments if segment.live.any()]
+    if segments:
+        return np.concatenate([np.asarray(segment.vectors[segment.live]) for segment in segments])
+
+    from chromadb import PersistentClient
+    from langchain_community.vectorstores import Chroma
+
+    collection = PersistentClient(path=persist_directory).get_collection(Chroma._LANGCHAIN_DEFAULT_COLLECTION_NAME)
+    return np.asarray(collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+
+
+def synthetic_vectors(rows: int, dim: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, rows // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), rows)] + 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def sample_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed copies of random rows, normalized like query embeddings"""
+    rng = np.random.default_rng(seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), count)]
+    queries = queries + 0.3 * np.std(vectors) * rng.normal(size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, squared_norms: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    distances = squared_norms - 2 * (vectors @ query)
+    top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+    return top[np.argsort(distances[top], kind="stable")]
+
+
+def percentile_ms(timings, q):
+    return float(np.percentile(timings, q) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--persist-directory", default="./chroma_db",
+                        help="Index root to read vectors from (its current version is used)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="ROWS", help="Use ROWS synthetic vectors instead")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensions of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to sample")
+    parser.add_argument("-k", type=int, default=5, help="Results per query (top_k)")
+    parser.add_argument("--compressions", nargs="+", default=DEFAULT_COMPRESSIONS)
+    parser.add_argument("--rescore", nargs="+", type=int, default=DEFAULT_RESCORE,
+                        help="Candidates rescored exactly (0 = none, rank by compressed distance only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim, args.seed)
+        source = f"{args.synthetic} synthetic vectors"
+    else:
+        source = str(IndexVersions(args.persist_directory).current_path())
+        try:
+            vectors = load_index_vectors(source)
+        except Exception as e:
+            print(f"❌ Could not read vectors from {source}: {e}")
+            print("   Build the index first (python init_vector_db.py) or pass --synthetic ROWS")
+            sys.exit(1)
+    if len(vectors) == 0:
+        print(f"❌ No vectors in {source}")
+        sys.exit(1)
+
+    k = min(args.k, len(vectors))
+    squared_norms = np.einsum("ij,ij->i", vectors, vectors)
+    queries = sample_queries(vectors, args.queries, args.seed)
+
+    print("=" * 72)
+    print(f"Compressed search report: {source} ({vectors.shape[0]} x {vectors.shape[1]}), k={k}")
+    print("=" * 72)
+
+    # Exact search is both the ground truth and the latency baseline
+    truth = []
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        truth.append(set(exact_top_k(vectors, squared_norms, query, k).tolist()))
+        timings.append(time.perf_counter() - start)
+    results = [{
+        "compression": "none", "rescore": None, "recall": 1.0, "index_bytes": int(vectors.nbytes),
+        "mean_ms": float(np.mean(timings) * 1000), "p95_ms": percentile_ms(timings, 95)
+    }]
+
+    for spec in args.compressions:
+        start = time.perf_counter()
+        compressed = CompressedVectors.fit(vectors, spec)
+        fit_seconds = time.perf_counter() - start
+        for depth in args.rescore:
+            hits = 0
+            timings = []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                approximate = compressed.distances(query[None, :])[0]
+                candidates_count = max(k, depth)
+                if candidates_count < len(approximate):
+                    candidates = np.argpartition(approximate, candidates_count - 1)[:candidates_count]
+                else:
+                    candidates = np.arange(len(approximate))
+                if depth:
+                    rows, _ = rescore(vectors, squared_norms, query, candidates, k)
+                else:
+                    rows = candidates[np.argsort(approximate[candidates], kind="stable")][:k]
+                timings.append(time.perf_counter() - start)
+                hits += len(expected.intersection(rows.tolist()))
+            results.append({
+                "compression": spec, "rescore": depth, "recall": hits / (k * len(queries)),
+                "index_bytes": compressed.nbytes, "fit_seconds": fit_seconds,
+                "mean_ms": float(np.mean(timings) * 1000), "p95_ms": percentile_ms(timings, 95)
+            })
+
+    print(f"{'compression':<14}{'rescore':>8}{'recall@' + str(k):>11}{'index MB':>11}{'mean ms':>10}{'p95 ms':>10}")
+    for result in results:
+        rescore_label = "-" if result["rescore"] is None else str(result["rescore"])
+        print(f"{result['compression']:<14}{rescore_label:>8}{result['recall']:>11.3f}"
+              f"{result['index_bytes'] / 1e6:>11.2f}{result['mean_ms']:>10.3f}{result['p95_ms']:>10.3f}")
+    print()
+    print("Pick a row with VECTOR_BACKEND=numpy VECTOR_COMPRESSION=<compression> VECTOR_RESCORE=<rescore>")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"source": source, "rows": int(vectors.shape[0]), "dim": int(vectors.shape[1]),
+                       "k": k, "queries": len(queries), "results": results}, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()